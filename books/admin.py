@@ -1,18 +1,59 @@
-from datetime import timedelta
-
+from django.contrib import messages
 from django.contrib.admin import SimpleListFilter
-from django.db.models import F
-from django.db.models.functions import Coalesce
-from django.utils import timezone
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied
+from django.db.models import Case, IntegerField, When
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.translation import ugettext_lazy as _
 
-from .forms import BookForm, PhysicalBookForm
+from . import autocomplete, circulation, desk, inventory
+from .forms import BookForm, DeskForm, InventoryAuditForm, MarkMissingForm, PhysicalBookForm
 from .models import *
+from .search import search_books
+
+
+class DefaultChangeList(ChangeList):
+    def apply_select_related(self, qs):
+        qs = super().apply_select_related(qs)
+        return qs.prefetch_related(*self.model_admin.list_prefetch_related)
 
 
 class DefaultModelAdmin(admin.ModelAdmin):
     list_per_page = 100
     actions = None
+    # Like `list_select_related`, for the many-valued relations shown in `list_display`
+    list_prefetch_related = ()
+    # Indexed keys of normalized text that autocompletes match by prefix, instead of `search_fields`
+    autocomplete_keys = ()
+
+    def get_changelist(self, request, **kwargs):
+        return DefaultChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        match = request.resolver_match
+        pks = self.autocomplete(queryset, search_term) if match and match.url_name == 'autocomplete' else None
+        if pks is None:
+            return super().get_search_results(request, queryset, search_term)
+
+        if not pks:
+            return queryset.none(), False
+
+        # The rows are shown by their `__str__`, which reads what the changelist rows read
+        queryset = queryset.filter(pk__in=pks).prefetch_related(*self.list_prefetch_related)
+        if isinstance(self.list_select_related, (list, tuple)):
+            queryset = queryset.select_related(*self.list_select_related)
+        # In the order of `pks`, ranked by the search, not in the order of the changelist
+        return queryset.order_by(Case(*(When(pk=pk, then=position) for position, pk in enumerate(pks)),
+                                      output_field=IntegerField())), False
+
+    def autocomplete(self, queryset, term):
+        """Primary keys of the autocomplete matches of `term`, or None to search `search_fields`."""
+        if self.autocomplete_keys:
+            return autocomplete.prefix_search(queryset, self.autocomplete_keys, term)
+        return None
 
 
 class DefaultListFilter(SimpleListFilter):
@@ -30,26 +71,31 @@ def choices(self, cl):
 class PublisherAdmin(DefaultModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
+    autocomplete_keys = ('name_key',)
 
 
 class ShelfAdmin(DefaultModelAdmin):
     search_fields = ('ddc', 'description',)
-    ordering = ('ddc',)
+    # Indexed, and sorts the DDC codes in their hierarchy order
+    ordering = ('subject_key', 'pk')
 
 
 class TranslatorAdmin(DefaultModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
+    autocomplete_keys = ('name_key',)
 
 
 class CollectionAdmin(DefaultModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
+    autocomplete_keys = ('name_key',)
 
 
 class AuthorAdmin(DefaultModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
+    autocomplete_keys = ('name_key',)
 
 
 class BookAdmin(DefaultModelAdmin):
@@ -60,6 +106,8 @@ class BookAdmin(DefaultModelAdmin):
         'collection',
     )
     list_display_links = ('title_str',)
+    list_select_related = ('publisher', 'collection',)
+    list_prefetch_related = ('authors',)
     search_fields = (
         'title',
         'isbn',
@@ -71,6 +119,34 @@ class BookAdmin(DefaultModelAdmin):
     autocomplete_fields = ('collection', 'publisher',
                            'authors', 'translators',)
 
+    def autocomplete(self, queryset, term):
+        # Through the search index, most recent books first for an empty term
+        if not term.strip():
+            return list(queryset.order_by('-pk').values_list('pk', flat=True)[:autocomplete.LIMIT])
+        return autocomplete.ranked_search(queryset, term, search_books)
+
+
+class AvailabilityFilter(DefaultListFilter):
+    title = _('Availability')
+
+    parameter_name = 'availability'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('available', _('Available')),
+            ('unavailable', _('Unavailable')),
+            (None, _('All')),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'available':
+            return queryset.available()
+
+        if self.value() == 'unavailable':
+            return queryset.unavailable()
+
+        return queryset
+
 
 class PhysicalBookAdmin(DefaultModelAdmin):
     list_display = (
@@ -82,6 +158,8 @@ class PhysicalBookAdmin(DefaultModelAdmin):
         'book_collection_str',
     )
     list_display_links = ('physical_id', 'book_title_str',)
+    list_select_related = ('book__publisher', 'book__collection', 'shelf',)
+    list_prefetch_related = ('book__authors',)
     search_fields = (
         'physical_id',
         'book__title',
@@ -93,12 +171,65 @@ class PhysicalBookAdmin(DefaultModelAdmin):
         'book__collection__name',
     )
     autocomplete_fields = ('book', 'shelf',)
-    list_filter = ('status',)
+    list_filter = ('status', AvailabilityFilter)
+
+    def autocomplete(self, queryset, term):
+        if not term.strip():
+            return list(queryset.order_by('-pk').values_list('pk', flat=True)[:autocomplete.LIMIT])
+        return autocomplete.ranked_search(queryset, term, autocomplete.search_copies)
+
+    def get_urls(self):
+        return [
+            path('inventory/', self.admin_site.admin_view(self.inventory_view), name='books_physicalbook_inventory'),
+        ] + super().get_urls()
+
+    def inventory_view(self, request):
+        """Stocktaking: compares the scanned physical IDs with the circulant copies, then may mark the missing ones."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('Inventory audit'),
+        }
+
+        if request.method == 'POST' and 'status' in request.POST:
+            if not self.has_change_permission(request):
+                raise PermissionDenied
+            mark_form = MarkMissingForm(request.POST)
+            if mark_form.is_valid():
+                status = mark_form.cleaned_data['status']
+                changed = inventory.mark_missing(mark_form.cleaned_data['missing'], status)
+                self.message_user(request, _('Copies marked as %(status)s: %(count)d') % {
+                    'status': BookStatus(status).label, 'count': changed}, messages.SUCCESS)
+                return HttpResponseRedirect(request.path)
+            self.message_user(request, _('Invalid physical IDs'), messages.ERROR)
+            return HttpResponseRedirect(request.path)
+
+        form = InventoryAuditForm(request.POST, request.FILES) if request.method == 'POST' else InventoryAuditForm()
+        if form.is_bound and form.is_valid():
+            invalid = []
+            scanned = inventory.parse_ids(form.cleaned_data['physical_ids'].splitlines(), invalid)
+            if form.cleaned_data['scans']:
+                scanned |= inventory.parse_ids(form.cleaned_data['scans'], invalid)
+
+            result = inventory.audit(scanned, form.cleaned_data['shelves'] or None, invalid)
+            context['result'] = result
+            context['unexpected'] = [(physical_id, BookStatus(status).label) for physical_id, status in result.unexpected]
+            if result.missing and self.has_change_permission(request):
+                context['mark_form'] = MarkMissingForm(initial={
+                    'missing': ','.join(map(str, result.missing)),
+                })
+
+        context['form'] = form
+        return TemplateResponse(request, 'admin/books/physicalbook/inventory.html', context)
 
 
 class ReaderAdmin(DefaultModelAdmin):
     search_fields = ('name', 'document', 'contact')
     ordering = ('name',)
+    autocomplete_keys = ('name_key', 'document')
 
 
 class BorrowStatusFilter(DefaultListFilter):
@@ -137,29 +268,100 @@ def lookups(self, request, model_admin):
         )
 
     def queryset(self, request, queryset):
-        if self.value():
-            date_limit = F('date_borrow') + \
-                (timedelta(weeks=1) * (F('renew_count') + 1))
-            queryset = queryset.annotate(on_date_limit=Coalesce(
-                'date_return', timezone.now().date()))
-
-            if self.value() == 'late':
-                return queryset.filter(on_date_limit__gt=date_limit)
+        if self.value() == 'late':
+            return queryset.late()
 
-            if self.value() == 'on_time':
-                return queryset.filter(on_date_limit__lte=date_limit)
+        if self.value() == 'on_time':
+            return queryset.on_time()
 
         return queryset
 
 
 class BorrowAdmin(DefaultModelAdmin):
     list_display = ('status_str', 'reader', 'book', 'date_borrow',
-                    'renew_count', 'date_return')
+                    'renew_count', 'due_date', 'date_return')
+    list_select_related = ('reader', 'book__book',)
+    list_prefetch_related = ('book__book__authors',)
     autocomplete_fields = ('book', 'reader')
     search_fields = ('book__book__title', 'reader__name',
                      'reader__document', 'reader__contact',)
     ordering = ('date_borrow',)
     list_filter = (BorrowStatusFilter, BorrowLateFilter)
+    readonly_fields = ('due_date',)
+    actions = ('renew',)
+
+    def get_urls(self):
+        return [
+            path('dashboard/', self.admin_site.admin_view(self.dashboard_view), name='books_borrow_dashboard'),
+            path('desk/', self.admin_site.admin_view(self.desk_view), name='books_borrow_desk'),
+        ] + super().get_urls()
+
+    def desk_view(self, request):
+        """Checks out, returns or renews a batch of scanned copies at once, see `desk.process`."""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+
+        form = DeskForm(request.POST) if request.method == 'POST' else DeskForm()
+        reader = form.fields['reader']
+        reader.widget = AutocompleteSelect(Borrow._meta.get_field('reader'), self.admin_site, choices=reader.choices)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('Circulation desk'),
+            'form': form,
+            'media': self.media + form.media,
+        }
+
+        if form.is_bound and form.is_valid():
+            try:
+                result = desk.process(form.cleaned_data['action'], form.cleaned_data['physical_ids'],
+                                      form.cleaned_data['reader'])
+            except ValidationError as e:
+                self.message_user(request, ' '.join(e.messages), messages.ERROR)
+            else:
+                self.message_user(request, _('%(action)s: %(count)d books') % {
+                    'action': desk.ACTIONS[form.cleaned_data['action']], 'count': len(result.done)}, messages.SUCCESS)
+                if result.errors:
+                    self.message_user(request, _('Books left as they were: %(count)d') % {
+                        'count': len(result.errors)}, messages.WARNING)
+                context['result'] = result
+
+        return TemplateResponse(request, 'admin/books/borrow/desk.html', context)
+
+    def dashboard_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        return TemplateResponse(request, 'admin/books/borrow/dashboard.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('Circulation dashboard'),
+            **circulation.dashboard(),
+        })
+
+    def get_actions(self, request):
+        # Only renewals, deleting stays disabled as on the other pages
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description=_('Renew selected borrows'))
+    def renew(self, request, queryset):
+        renewed = 0
+        for borrow in queryset.filter(date_return__isnull=True):
+            borrow.renew()
+            renewed += 1
+
+        self.message_user(request, _('Borrows renewed: %(count)d') % {'count': renewed}, messages.SUCCESS)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ValidationError as e:
+            # Lost a race for the book with another desk, see `Borrow.save`
+            self.message_user(request, ' '.join(e.messages), messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
 
 
 admin.site.register(Publisher, PublisherAdmin)
@@ -6,3 +6,6 @@ class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
     verbose_name = _('Library')
+
+    def ready(self):
+        from . import signals  # noqa: F401
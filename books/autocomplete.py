@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Q, When
+
+from .text import normalize_name
+
+# Matches returned per term, the admin shows them 20 at a time
+LIMIT = 60
+
+# Recent results kept per worker, for CACHE_TTL at most however their model changes
+CACHE_SIZE = 2000
+CACHE_TTL = 5 * 60
+
+
+class ResultCache:
+    """LRU of recent autocomplete results of this worker, stale once their model changes (see `invalidate`)."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+results = ResultCache(CACHE_SIZE, CACHE_TTL)
+
+
+def _version_key(model):
+    return f'autocomplete:{model._meta.label_lower}'
+
+
+def _version(model):
+    # Kept in the default cache: with a shared backend (CACHE_URL) a change in one worker reaches the
+    # results of all. With the per process locmem default, other workers serve theirs until CACHE_TTL
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(model):
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        # No cached result depends on it yet
+        pass
+
+
+def prefix_search(queryset, fields, term) -> list:
+    """
+    Primary keys of the first LIMIT rows of `queryset` where one of `fields`, indexed keys of
+    normalized text, starts with the normalized `term`.
+
+    Typing only narrows a term, so when a shorter term had no more than LIMIT matches the new
+    ones are among them and are filtered without a query. Most keystrokes never reach the database.
+    """
+    key = normalize_name(term)
+    scope = (queryset.model._meta.label_lower, str(queryset.query), fields, _version(queryset.model))
+
+    cached = results.get((scope, key))
+    if cached is None:
+        for length in range(len(key) - 1, -1, -1):
+            shorter = results.get((scope, key[:length]))
+            if shorter is not None and shorter['complete']:
+                rows = [row for row in shorter['rows'] if any(value and value.startswith(key) for value in row[1:])]
+                break
+        else:
+            condition = reduce(or_, (Q(**{f'{field}__startswith': key}) for field in fields)) if key else Q()
+            rows = list(queryset.filter(condition).order_by(fields[0]).values_list('pk', *fields)[:LIMIT + 1])
+
+        cached = {'rows': rows[:LIMIT], 'complete': len(rows) <= LIMIT}
+        results.set((scope, key), cached)
+
+    return [row[0] for row in cached['rows']]
+
+
+def ranked_search(queryset, term, search) -> list:
+    """Primary keys of the first LIMIT rows `search(term, queryset)` returns, cached as `prefix_search` does."""
+    key = normalize_name(term)
+    scope = (queryset.model._meta.label_lower, str(queryset.query), search.__qualname__, _version(queryset.model))
+
+    pks = results.get((scope, key))
+    if pks is None:
+        pks = list(search(term, queryset).values_list('pk', flat=True)[:LIMIT])
+        results.set((scope, key), pks)
+
+    return pks
+
+
+def search_copies(term, queryset):
+    """Copies with the physical ID `term` first, then the copies of the books best matching it."""
+    from .search import search_books
+
+    copies = queryset.filter(book__in=search_books(term).values('pk')[:LIMIT])
+    if not term.strip().isdigit():
+        return copies.order_by('book', 'physical_id')
+
+    physical_id = int(term)
+    return (copies | queryset.filter(physical_id=physical_id)).order_by(
+        Case(When(physical_id=physical_id, then=0), default=1, output_field=IntegerField()), 'book', 'physical_id')
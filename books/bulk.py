@@ -0,0 +1,28 @@
+from django.db import connection, transaction
+
+
+def bulk_create_with_pks(model, objs, batch_size=500) -> list:
+    """
+    `bulk_create` that sets the primary key of the created objects on every backend.
+
+    Backends that cannot return ids from a bulk insert (SQLite on Django 3.2)
+    get them back from the newest rows. Must run inside a transaction, which
+    holds the write lock on those backends, so the newest rows are ours.
+    """
+    if not objs:
+        return objs
+
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError('bulk_create_with_pks must run inside a transaction')
+
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    pks = model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objs)]
+
+    for obj, pk in zip(objs, reversed(list(pks))):
+        obj.pk = pk
+        obj._state.adding = False
+
+    return objs
@@ -0,0 +1,104 @@
+from collections import Counter
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+
+def borrow_changes(date_borrow, date_return, shelf_id, sign=1) -> Counter:
+    """Contribution of one borrow to `DailyCirculation`, keyed by (date, shelf_id, counter)."""
+    changes = Counter({(date_borrow, shelf_id, 'borrows'): sign})
+    if date_return:
+        changes[(date_return, shelf_id, 'returns')] += sign
+    return changes
+
+
+def copy_moved_changes(copy_id, old_shelf_id, new_shelf_id) -> Counter:
+    """
+    Changes to `DailyCirculation` when a copy moves to another shelf. Borrows count under the
+    current shelf of their copy, as `rebuild` counts them, so its whole history moves along.
+    """
+    from .models import Borrow
+
+    changes = Counter()
+    if old_shelf_id == new_shelf_id:
+        return changes
+
+    for field, date_field in (('borrows', 'date_borrow'), ('returns', 'date_return')):
+        for day, count in Borrow.objects.filter(book=copy_id, **{f'{date_field}__isnull': False}).order_by(
+                ).values_list(date_field).annotate(Count('pk')):
+            changes[(day, old_shelf_id, field)] -= count
+            changes[(day, new_shelf_id, field)] += count
+    return changes
+
+
+def _add(model, key, field, delta):
+    with transaction.atomic():
+        if not model.objects.filter(**key).update(**{field: F(field) + delta}):
+            model.objects.get_or_create(**key)
+            model.objects.filter(**key).update(**{field: F(field) + delta})
+
+
+def apply_circulation_changes(changes):
+    """Adds `changes`, as built by `borrow_changes`, to the daily circulation rollup."""
+    from .models import DailyCirculation
+
+    # Always in the same order, so concurrent writers do not deadlock
+    changes = sorted(changes.items(), key=lambda item: (item[0][0], item[0][1] or 0, item[0][2]))
+    for (day, shelf_id, field), delta in changes:
+        if delta:
+            _add(DailyCirculation, {'date': day, 'shelf_id': shelf_id}, field, delta)
+
+
+def apply_status_changes(changes):
+    """Adds `changes`, a Counter of physical books by status, to the status rollup."""
+    from .models import StatusCount
+
+    for status, delta in sorted(changes.items()):
+        if delta:
+            _add(StatusCount, {'status': status}, 'copies', delta)
+
+
+def rebuild():
+    """Recomputes both rollups from `Borrow` and `PhysicalBook`, borrows under the current shelf of their copy."""
+    from .models import Borrow, DailyCirculation, PhysicalBook, StatusCount
+
+    circulation = {}
+    for field, date_field in (('borrows', 'date_borrow'), ('returns', 'date_return')):
+        for day, shelf_id, count in Borrow.objects.filter(**{f'{date_field}__isnull': False}).order_by().values_list(
+                date_field, 'book__shelf').annotate(Count('pk')):
+            row = circulation.setdefault((day, shelf_id), DailyCirculation(date=day, shelf_id=shelf_id))
+            setattr(row, field, count)
+
+    statuses = PhysicalBook.objects.order_by().values_list('status').annotate(Count('pk'))
+
+    with transaction.atomic():
+        DailyCirculation.objects.all().delete()
+        DailyCirculation.objects.bulk_create(circulation.values(), batch_size=1000)
+        StatusCount.objects.all().delete()
+        StatusCount.objects.bulk_create(StatusCount(status=status, copies=count) for status, count in statuses)
+
+
+def dashboard(months=12, top_shelves=20) -> dict:
+    """Circulation overview, read from the rollups and the partial indexes on open borrows."""
+    from .models import BookStatus, Borrow, DailyCirculation, StatusCount
+
+    today = date.today()
+    month = today.year * 12 + today.month - months
+    since = date(month // 12, month % 12 + 1, 1)
+
+    counts = dict(StatusCount.objects.values_list('status', 'copies'))
+    recent = DailyCirculation.objects.filter(date__gte=since).order_by()
+
+    return {
+        'since': since,
+        'statuses': [(label, counts.get(status, 0)) for status, label in BookStatus.choices],
+        'copies': sum(counts.values()),
+        'on_loan': Borrow.objects.filter(date_return__isnull=True).count(),
+        'overdue': Borrow.objects.overdue(today).count(),
+        'months': recent.annotate(month=TruncMonth('date')).values('month').annotate(
+            borrows=Sum('borrows'), returns=Sum('returns')).order_by('month'),
+        'shelves': recent.values('shelf__ddc', 'shelf__description').annotate(
+            borrows=Sum('borrows'), returns=Sum('returns')).order_by('-borrows')[:top_shelves],
+    }
@@ -0,0 +1,139 @@
+from collections import Counter
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from .bulk import bulk_create_with_pks
+from .circulation import apply_circulation_changes, borrow_changes
+from .search_cache import invalidate_filters
+
+CHECKOUT = 'checkout'
+RETURN = 'return'
+RENEW = 'renew'
+
+ACTIONS = {
+    CHECKOUT: _('Checkout'),
+    RETURN: _('Return'),
+    RENEW: _('Renew'),
+}
+
+# Copies per batch, about what a desk scans in a day
+MAX_COPIES = 1000
+
+
+class DeskResult:
+    def __init__(self):
+        # Borrows created or changed, in the order their copies were given
+        self.done = []
+        # (physical ID, message) of the copies left as they were
+        self.errors = []
+
+
+def _check(action, copy, reader, today):
+    """Why `action` can not be applied to `copy`, or None."""
+    from .models import BookStatus
+
+    if action == CHECKOUT:
+        if copy.current_borrow_id:
+            return _('This book is already borrowed')
+        if copy.status != BookStatus.circulant:
+            return _('This book is not circulant')
+        return None
+
+    borrow = copy.current_borrow
+    if borrow is None:
+        return _('This book is not borrowed')
+    if reader is not None and borrow.reader_id != reader.pk:
+        return _('This book is borrowed by another reader')
+    if action == RETURN and today < borrow.date_borrow:
+        return _('Return date cannot be before borrow date')
+    return None
+
+
+def process(action, physical_ids, reader=None, today=None) -> DeskResult:
+    """
+    Checks out the copies `physical_ids` to `reader`, or returns or renews them (those of `reader`
+    only, if given), as one transaction.
+
+    The copies are read, and locked, in one query and checked together. Copies that can not take
+    the action are reported in `errors` and left alone, the others are written with `bulk_create`
+    and `bulk_update`, keeping what `Borrow.save` and its signals keep: due dates, the current
+    borrow of the copies and the circulation rollup.
+    """
+    from .models import Borrow, PhysicalBook
+
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown desk action {action}')
+    if action == CHECKOUT and reader is None:
+        raise ValueError('Checkouts need a reader')
+
+    today = today or datetime.today().date()
+    result = DeskResult()
+    physical_ids = list(dict.fromkeys(physical_ids))
+
+    try:
+        with transaction.atomic():
+            copies = {
+                copy.physical_id: copy for copy in PhysicalBook.objects.select_for_update().select_related(
+                    'current_borrow__reader').filter(physical_id__in=physical_ids)
+            }
+
+            accepted = []
+            for physical_id in physical_ids:
+                copy = copies.get(physical_id)
+                error = _('Unknown physical ID') if copy is None else _check(action, copy, reader, today)
+                if error:
+                    result.errors.append((physical_id, error))
+                else:
+                    accepted.append(copy)
+
+            now = timezone.now()
+            changes = Counter()
+            for copy in accepted:
+                if copy.current_borrow:
+                    copy.current_borrow.book = copy
+
+            if action == CHECKOUT:
+                borrows = [Borrow(book=copy, reader=reader, date_borrow=today) for copy in accepted]
+                for borrow in borrows:
+                    borrow.due_date = borrow.compute_due_date()
+                bulk_create_with_pks(Borrow, borrows)
+
+                for copy, borrow in zip(accepted, borrows):
+                    copy.current_borrow = borrow
+                    copy.updated_at = now
+                    changes.update(borrow_changes(today, None, copy.shelf_id))
+                PhysicalBook.objects.bulk_update(accepted, ['current_borrow', 'updated_at'], batch_size=500)
+
+            elif action == RETURN:
+                borrows = [copy.current_borrow for copy in accepted]
+                for copy, borrow in zip(accepted, borrows):
+                    borrow.date_return = today
+                    copy.current_borrow = None
+                    copy.updated_at = now
+                    changes[(today, copy.shelf_id, 'returns')] += 1
+                Borrow.objects.bulk_update(borrows, ['date_return'], batch_size=500)
+                PhysicalBook.objects.bulk_update(accepted, ['current_borrow', 'updated_at'], batch_size=500)
+
+            else:
+                borrows = [copy.current_borrow for copy in accepted]
+                for copy, borrow in zip(accepted, borrows):
+                    borrow.renew_count += 1
+                    borrow.due_date = borrow.compute_due_date()
+                    copy.updated_at = now
+                Borrow.objects.bulk_update(borrows, ['renew_count', 'due_date'], batch_size=500)
+                PhysicalBook.objects.bulk_update(accepted, ['updated_at'], batch_size=500)
+
+            # `bulk_create` and `bulk_update` send no signals, the rollup is kept here
+            apply_circulation_changes(changes)
+            if action != RENEW:
+                transaction.on_commit(invalidate_filters)
+            result.done = borrows
+    except IntegrityError:
+        # Lost a race for a copy with a single checkout, which does not lock it, see `Borrow.save`
+        raise ValidationError(_('A book was borrowed at another desk meanwhile, try again'))
+
+    return result
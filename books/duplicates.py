@@ -0,0 +1,212 @@
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from django.db import transaction
+from django.utils import timezone
+
+from .search import STOP_WORDS, compact_isbn, index_books, stem
+from .text import normalize_name, tokenize
+
+# Blocks larger than this (a very common surname...) are skipped, as comparing within them is quadratic
+MAX_BLOCK_SIZE = 100
+
+# Book fields filled from the duplicates when blank in the book kept
+BOOK_DETAILS = ('isbn', 'publisher_id', 'collection_id', 'local', 'year', 'page_count', 'pha')
+AUTHOR_DETAILS = ('year_of_birth', 'year_of_death', 'pha', 'pha_label', 'observation')
+
+
+class Candidate:
+    def __init__(self, keep, remove, score, block):
+        self.keep = keep
+        self.remove = remove
+        self.score = score
+        self.block = block
+
+
+def _pairs(blocks):
+    """Pairs of primary keys sharing a block, each with the first block it was found in."""
+    seen = {}
+    for block, pks in blocks.items():
+        if len(pks) > MAX_BLOCK_SIZE:
+            continue
+        for pair in combinations(sorted(pks), 2):
+            seen.setdefault(pair, block)
+    return seen.items()
+
+
+def _similarity(a, b) -> float:
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def name_blocks(tokens) -> list:
+    """
+    Blocking keys of a name: its sorted words ('Assis, Machado de'), its first initial and last
+    word ('M. de Assis') and the sorted 4 letter prefixes of its words (most typos).
+    """
+    if not tokens:
+        return []
+    return [
+        'words:' + ' '.join(sorted(tokens)),
+        f'initial:{tokens[0][0]} {tokens[-1]}',
+        'prefixes:' + ' '.join(sorted(token[:4] for token in tokens)),
+    ]
+
+
+def find_named_duplicates(model, threshold) -> list:
+    """`Candidate` pairs of `model`, a `NamedModel`, with names at least `threshold` similar."""
+    tokens = {pk: tokenize(name) for pk, name in model.objects.values_list('pk', 'name').iterator()}
+
+    blocks = defaultdict(set)
+    for pk, words in tokens.items():
+        for block in name_blocks(words):
+            blocks[block].add(pk)
+
+    candidates = []
+    for (first, second), block in _pairs(blocks):
+        a, b = tokens[first], tokens[second]
+        score = max(_similarity(' '.join(a), ' '.join(b)), _similarity(' '.join(sorted(a)), ' '.join(sorted(b))))
+        if score >= threshold:
+            candidates.append(Candidate(first, second, score, block))
+
+    return sorted(candidates, key=lambda candidate: -candidate.score)
+
+
+def isbn13(isbn):
+    """ISBN-13 of an ISBN-10 or ISBN-13 in the `compact_isbn` form."""
+    if isbn is None or len(isbn) == 13:
+        return isbn
+    digits = '978' + isbn[:9]
+    check = (10 - sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def book_blocks(book) -> list:
+    """Blocking keys of a book: its ISBN, and its first title words with the sorted name words of an author."""
+    blocks = []
+    if book['isbn']:
+        blocks.append('isbn:' + book['isbn'])
+
+    words = sorted({stem(token) for token in tokenize(book['title'])} - STOP_WORDS)[:4]
+    for author in book['authors'] or ['']:
+        blocks.append(f'title:{" ".join(words)}|{author}')
+
+    return blocks
+
+
+def book_score(a, b) -> float:
+    # Other volumes or editions of a work are not duplicates of it
+    if a['volume'] != b['volume'] or (a['edition'] and b['edition'] and a['edition'] != b['edition']):
+        return 0
+
+    title = _similarity(a['title'], b['title'])
+    authors = len(a['authors'] & b['authors']) / len(a['authors'] | b['authors']) if a['authors'] | b['authors'] else 1
+    publisher = 1 if a['publisher_id'] == b['publisher_id'] else 0
+    score = 0.6 * title + 0.3 * authors + 0.1 * publisher
+
+    if a['isbn'] and a['isbn'] == b['isbn']:
+        score = max(score, 0.95)
+    elif a['isbn'] and b['isbn']:
+        # Two different ISBNs are two different books
+        score -= 0.3
+
+    if a['year'] and b['year'] and a['year'] != b['year']:
+        score -= 0.1
+
+    return max(score, 0)
+
+
+def find_book_duplicates(threshold) -> list:
+    from .models import Book
+
+    books = {}
+    for pk, title, volume, edition, year, isbn, publisher_id in Book.objects.values_list(
+            'pk', 'title', 'volume', 'edition', 'year', 'isbn', 'publisher_id').iterator():
+        books[pk] = {
+            'title': normalize_name(title), 'volume': normalize_name(volume or ''), 'edition': edition,
+            'year': year, 'isbn': isbn13(compact_isbn(isbn)), 'publisher_id': publisher_id, 'authors': set(),
+        }
+    # Authors by their sorted name words, so books of duplicate authors still compare equal
+    for book_id, name in Book.authors.through.objects.values_list('book_id', 'author__name').iterator():
+        books[book_id]['authors'].add(' '.join(sorted(tokenize(name))))
+
+    blocks = defaultdict(set)
+    for pk, book in books.items():
+        for block in book_blocks(book):
+            blocks[block].add(pk)
+
+    candidates = []
+    for (first, second), block in _pairs(blocks):
+        score = book_score(books[first], books[second])
+        if score >= threshold:
+            candidates.append(Candidate(first, second, score, block))
+
+    return sorted(candidates, key=lambda candidate: -candidate.score)
+
+
+def _merge_many_to_many(through, column, other, keep, remove):
+    """Points the rows of `through` at `remove` to `keep`, dropping those that would repeat a row."""
+    linked = set(through.objects.filter(**{column: keep}).values_list(other, flat=True))
+    moved, repeated = [], []
+    for pk, value in through.objects.filter(**{f'{column}__in': remove}).values_list('pk', other):
+        (repeated if value in linked else moved).append(pk)
+        linked.add(value)
+
+    through.objects.filter(pk__in=repeated).delete()
+    through.objects.filter(pk__in=moved).update(**{column: keep})
+
+
+def merge_named(model, keep, remove):
+    """Merges the rows `remove` of `model`, a `NamedModel`, into the row `keep`."""
+    from .models import Author, Book, Publisher
+
+    with transaction.atomic():
+        kept = model.objects.select_for_update().get(pk=keep)
+        field = model._meta.model_name
+        many = field in ('author', 'translator')
+        book_ids = list(Book.objects.filter(**{f'{field}s__in' if many else f'{field}__in': remove}).values_list(
+            'pk', flat=True).distinct())
+
+        if many:
+            _merge_many_to_many(getattr(Book, f'{field}s').through, f'{field}_id', 'book_id', keep, remove)
+        else:
+            Book.objects.filter(**{f'{field}__in': remove}).update(**{field: keep})
+
+        if model is Author:
+            for duplicate in model.objects.filter(pk__in=remove).order_by('pk'):
+                for detail in AUTHOR_DETAILS:
+                    if not getattr(kept, detail) and getattr(duplicate, detail):
+                        setattr(kept, detail, getattr(duplicate, detail))
+            kept.save()
+
+        model.objects.filter(pk__in=remove).delete()
+
+        Book.objects.filter(pk__in=book_ids).touch()
+        if model is not Publisher:
+            index_books(book_ids)
+
+
+def merge_books(keep, remove):
+    """Merges the books `remove` into the book `keep`: their copies, authors, translators and missing details."""
+    from . import subjects
+    from .models import Book, PhysicalBook
+
+    with transaction.atomic():
+        kept = Book.objects.select_for_update().get(pk=keep)
+
+        copies = list(PhysicalBook.objects.filter(book__in=remove).values_list('pk', 'book', 'shelf__subject_key'))
+        changes = subjects.copy_changes(added=[(pk, keep, key) for pk, _book, key in copies], removed=copies)
+        PhysicalBook.objects.filter(book__in=remove).update(book=keep, updated_at=timezone.now())
+        subjects.apply_changes(changes)
+
+        _merge_many_to_many(Book.authors.through, 'book_id', 'author_id', keep, remove)
+        _merge_many_to_many(Book.translators.through, 'book_id', 'translator_id', keep, remove)
+
+        for duplicate in Book.objects.filter(pk__in=remove).order_by('pk'):
+            for detail in BOOK_DETAILS:
+                if getattr(kept, detail) in (None, '') and getattr(duplicate, detail) not in (None, ''):
+                    setattr(kept, detail, getattr(duplicate, detail))
+
+        Book.objects.filter(pk__in=remove).delete()
+        # Saving indexes it again, with the authors and translators it got
+        kept.save()
@@ -0,0 +1,170 @@
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from itertools import islice
+
+# Rows read per database round trip, and per lookup of their authors
+CHUNK_SIZE = 2000
+
+
+class Export:
+    """
+    A dump of `model` as flat rows: `columns` are read with `values_list`, joins included, and
+    `authors` of the `book_lookup` of each chunk of rows are added in one more query.
+    """
+
+    def __init__(self, model, columns, date_field, book_lookup=None):
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.book_lookup = book_lookup
+
+    @property
+    def header(self) -> list:
+        return [name for name, _ in self.columns] + (['authors'] if self.book_lookup else [])
+
+    def queryset(self, since=None, until=None):
+        queryset = self.model.objects.order_by('pk')
+        if since:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': since})
+        if until:
+            queryset = queryset.filter(**{f'{self.date_field}__lte': until})
+
+        lookups = [lookup for _, lookup in self.columns]
+        if self.book_lookup:
+            lookups.append(self.book_lookup)
+        return queryset.values_list(*lookups)
+
+    def rows(self, since=None, until=None):
+        """Rows of the export, in constant memory: the queryset is read through a cursor, chunk by chunk."""
+        from .models import Book
+
+        rows = self.queryset(since, until).iterator(chunk_size=CHUNK_SIZE)
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                return
+
+            if not self.book_lookup:
+                yield from chunk
+                continue
+
+            authors = {}
+            for book_id, name in Book.authors.through.objects.filter(
+                    book_id__in={row[-1] for row in chunk}).order_by('pk').values_list('book_id', 'author__name'):
+                authors.setdefault(book_id, []).append(name)
+
+            for row in chunk:
+                yield (*row[:-1], ' | '.join(authors.get(row[-1], [])))
+
+
+def _physical_books():
+    from .models import PhysicalBook
+
+    return Export(PhysicalBook, (
+        ('physical_id', 'physical_id'),
+        ('status', 'status'),
+        ('borrowed', 'current_borrow'),
+        ('shelf_ddc', 'shelf__ddc'),
+        ('shelf_description', 'shelf__description'),
+        ('observations', 'observations'),
+        ('book_id', 'book'),
+        ('title', 'book__title'),
+        ('volume', 'book__volume'),
+        ('edition', 'book__edition'),
+        ('isbn', 'book__isbn'),
+        ('year', 'book__year'),
+        ('publisher', 'book__publisher__name'),
+        ('collection', 'book__collection__name'),
+        ('updated_at', 'updated_at'),
+    ), date_field='updated_at__date', book_lookup='book')
+
+
+def _borrows():
+    from .models import Borrow
+
+    return Export(Borrow, (
+        ('id', 'pk'),
+        ('physical_id', 'book__physical_id'),
+        ('title', 'book__book__title'),
+        ('reader_id', 'reader'),
+        ('reader', 'reader__name'),
+        ('document', 'reader__document'),
+        ('date_borrow', 'date_borrow'),
+        ('due_date', 'due_date'),
+        ('date_return', 'date_return'),
+        ('renew_count', 'renew_count'),
+    ), date_field='date_borrow')
+
+
+EXPORTS = {
+    'physical_books': _physical_books,
+    'borrows': _borrows,
+}
+
+FORMATS = ('csv', 'json')
+
+
+def get_export(name) -> Export:
+    return EXPORTS[name]()
+
+
+def _value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+class _Line:
+    """File-like object handing back what `csv.writer` writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_value(value) for value in row])
+
+
+def json_lines(header, rows):
+    """A JSON array of objects, written one object per line."""
+    separator = '[\n'
+    for row in rows:
+        yield separator + json.dumps(dict(zip(header, map(_value, row))), ensure_ascii=False)
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+def encode(lines, compress=False, buffer_size=64 * 1024):
+    """Bytes of `lines`, gzipped if `compress`, in blocks of about `buffer_size`."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            block = compressor.compress(block) if compressor else block
+            if block:
+                yield block
+
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+def stream(name, output_format='csv', compress=False, since=None, until=None):
+    """The export `name` as a stream of bytes, see `encode`."""
+    export = get_export(name)
+    lines = csv_lines if output_format == 'csv' else json_lines
+    return encode(lines(export.header, export.rows(since, until)), compress)
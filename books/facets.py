@@ -0,0 +1,111 @@
+from django.core.exceptions import BadRequest
+from django.db.models import Count, Exists, F, OuterRef, QuerySet
+from django.utils.translation import ugettext_lazy as _
+
+# Values listed per facet, the most frequent first
+FACET_SIZE = 10
+
+NUMBER_FILTERS = ('shelf', 'publisher', 'collection', 'year_min', 'year_max')
+
+
+def parse_filters(params) -> dict:
+    """Facet filters of a query string, as a mapping of filter name to value."""
+    from .models import BookStatus
+
+    filters = {}
+    for name in NUMBER_FILTERS:
+        if params.get(name):
+            try:
+                filters[name] = int(params[name])
+            except ValueError:
+                raise BadRequest(f'Filter {name} must be a number')
+
+    if params.get('status'):
+        if params['status'] not in BookStatus.values:
+            raise BadRequest('Unknown status')
+        filters['status'] = params['status']
+
+    if params.get('available') == '1':
+        filters['available'] = 1
+
+    return filters
+
+
+def filter_books(queryset, filters) -> QuerySet:
+    from .models import PhysicalBook
+
+    for name, lookup in (('publisher', 'publisher_id'), ('collection', 'collection_id'),
+                         ('year_min', 'year__gte'), ('year_max', 'year__lte')):
+        if name in filters:
+            queryset = queryset.filter(**{lookup: filters[name]})
+
+    # Conditions on the copies must hold for the same copy, as in "an available copy of this subject"
+    if {'shelf', 'status', 'available'} & filters.keys():
+        copies = PhysicalBook.objects.filter(book=OuterRef('pk'))
+        if 'shelf' in filters:
+            copies = copies.filter(shelf_id=filters['shelf'])
+        if 'status' in filters:
+            copies = copies.filter(status=filters['status'])
+        if 'available' in filters:
+            copies = copies.available()
+        queryset = queryset.filter(Exists(copies))
+
+    return queryset
+
+
+def count_facets(books) -> dict:
+    """
+    Facet values of `books`, a query of book ids, with the number of books of each.
+
+    One grouped query per facet, all reading `books` as a subquery, so the matching
+    books are never loaded and the cost does not depend on how many there are.
+    """
+    from .models import Book, PhysicalBook
+
+    matching = Book.objects.filter(pk__in=books).order_by()
+    copies = PhysicalBook.objects.filter(book__in=books).order_by()
+
+    def top(queryset, *fields, count='pk'):
+        return [list(row) for row in queryset.values_list(*fields).annotate(
+            count=Count(count, distinct=count != 'pk')).order_by('-count', fields[0])[:FACET_SIZE]]
+
+    return {
+        'shelf': top(copies.filter(shelf__isnull=False), 'shelf', 'shelf__ddc', 'shelf__description', count='book'),
+        'publisher': top(matching.filter(publisher__isnull=False), 'publisher', 'publisher__name'),
+        'collection': top(matching.filter(collection__isnull=False), 'collection', 'collection__name'),
+        'decade': [list(row) for row in matching.filter(year__isnull=False).annotate(
+            decade=F('year') / 10 * 10).values_list('decade').annotate(count=Count('pk')).order_by('decade')],
+        'status': top(copies, 'status', count='book'),
+        'available': copies.available().values('book').distinct().count(),
+    }
+
+
+def facet_links(counts, params) -> list:
+    """Facets to render, each value with the link that selects it or, if selected, clears it."""
+    from .models import BookStatus
+
+    params = params.copy()
+    params.pop('after', None)
+
+    def link(label, count, **selection):
+        query = params.copy()
+        selected = all(query.get(name) == str(value) for name, value in selection.items())
+        for name, value in selection.items():
+            if selected:
+                query.pop(name, None)
+            else:
+                query[name] = value
+        return {'label': label, 'count': count, 'selected': selected, 'query': query.urlencode()}
+
+    facets = [
+        (_('Subjects'), [link(f'{ddc} - {description}' if ddc else description, count, shelf=pk)
+                         for pk, ddc, description, count in counts['shelf']]),
+        (_('Publishers'), [link(name, count, publisher=pk) for pk, name, count in counts['publisher']]),
+        (_('Collections'), [link(name, count, collection=pk) for pk, name, count in counts['collection']]),
+        (_('Years'), [link(f'{decade}-{decade + 9}', count, year_min=decade, year_max=decade + 9)
+                      for decade, count in counts['decade']]),
+        (_('Status'), [link(BookStatus(status).label, count, status=status) for status, count in counts['status']]),
+        (_('Availability'), [link(_('Available'), counts['available'], available=1)] if counts['available'] else []),
+    ]
+
+    return [{'label': label, 'values': values} for label, values in facets if values]
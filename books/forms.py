@@ -1,7 +1,9 @@
 from django import forms
-from django.utils.translation import gettext as _
+from django.utils.translation import ugettext_lazy as _
 
-from books.models import Book, PhysicalBook
+from books.desk import ACTIONS, CHECKOUT, MAX_COPIES
+from books.inventory import MISSING_STATUSES, parse_ids
+from books.models import Book, BookStatus, PhysicalBook, Reader, Shelf
 
 
 class BookForm(forms.ModelForm):
@@ -17,9 +19,55 @@ class Meta:
 
 
 class PhysicalBookForm(forms.ModelForm):
-    physical_id = forms.IntegerField(
-        label=_('Physical ID'), initial=PhysicalBook.next_physical_id)
-
     class Meta:
         model = PhysicalBook
         fields = '__all__'
+
+
+class InventoryAuditForm(forms.Form):
+    scans = forms.FileField(required=False, label=_('Scans file'), help_text=_('One physical ID per line'))
+    physical_ids = forms.CharField(
+        required=False, widget=forms.Textarea(attrs={'rows': 10}), label=_('Physical IDs'),
+        help_text=_('Or paste them here, one per line'))
+    shelves = forms.ModelMultipleChoiceField(
+        Shelf.objects.order_by('subject_key', 'pk'), required=False, label=_('Subjects'),
+        help_text=_('Only expect the copies of these subjects, all of them if none is selected'))
+
+    def clean(self):
+        data = super().clean()
+        if not data.get('scans') and not data.get('physical_ids', '').strip():
+            raise forms.ValidationError(_('Upload a file or paste the scanned physical IDs'))
+        return data
+
+
+class MarkMissingForm(forms.Form):
+    missing = forms.CharField(widget=forms.HiddenInput)
+    status = forms.ChoiceField(
+        choices=[(status, BookStatus(status).label) for status in MISSING_STATUSES], label=_('Mark missing copies as'))
+
+    def clean_missing(self):
+        try:
+            return [int(physical_id) for physical_id in self.cleaned_data['missing'].split(',')]
+        except ValueError:
+            raise forms.ValidationError(_('Invalid physical IDs'))
+
+
+class DeskForm(forms.Form):
+    action = forms.ChoiceField(choices=list(ACTIONS.items()), label=_('Action'))
+    reader = forms.ModelChoiceField(
+        Reader.objects.all(), required=False, label=_('Reader'),
+        help_text=_('Needed for checkouts. For returns and renewals, only the copies of this reader are accepted'))
+    physical_ids = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 10}), label=_('Physical IDs'), help_text=_('One per line'))
+
+    def clean_physical_ids(self):
+        physical_ids = sorted(parse_ids(self.cleaned_data['physical_ids'].splitlines()))
+        if len(physical_ids) > MAX_COPIES:
+            raise forms.ValidationError(_('At most %(count)d books at a time') % {'count': MAX_COPIES})
+        return physical_ids
+
+    def clean(self):
+        data = super().clean()
+        if data.get('action') == CHECKOUT and not data.get('reader'):
+            self.add_error('reader', _('Checkouts need a reader'))
+        return data
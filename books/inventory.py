@@ -0,0 +1,117 @@
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+# Physical IDs per `__in` lookup, below the SQLite limit of query parameters
+BATCH_SIZE = 500
+
+# What copies missing at a stocktaking may be marked as
+MISSING_STATUSES = ('lost_by_user', 'archived')
+
+_ID_RE = re.compile(r'\d+')
+
+
+class Audit:
+    """Outcome of a stocktaking, as sorted lists of physical IDs."""
+
+    def __init__(self, missing, on_loan, scanned_on_loan, unexpected, unknown, invalid, scanned):
+        # Circulant copies neither scanned nor on loan
+        self.missing = missing
+        # Circulant copies not scanned, but on loan
+        self.on_loan = on_loan
+        # Copies scanned on the shelves while their loan is still open
+        self.scanned_on_loan = scanned_on_loan
+        # Copies scanned that are not circulant, with their status
+        self.unexpected = unexpected
+        # IDs scanned that no copy has
+        self.unknown = unknown
+        # Lines that hold no ID
+        self.invalid = invalid
+        self.scanned = scanned
+
+
+def parse_ids(lines, invalid=None) -> set:
+    """
+    Physical IDs in `lines`, an iterable of str or bytes such as an uploaded file, one scan per
+    line. Lines without digits are added to `invalid` if given; scanned twice counts once.
+    """
+    ids = set()
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if not line:
+            continue
+
+        match = _ID_RE.search(line)
+        if match:
+            ids.add(int(match.group()))
+        elif invalid is not None:
+            invalid.append((number, line))
+    return ids
+
+
+def _batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def audit(scanned, shelves=None, invalid=()) -> Audit:
+    """
+    Compares the `scanned` physical IDs with the circulant copies, those on `shelves` only if given.
+    The circulant copies are read in one query and the scans that are not among them in one query
+    per BATCH_SIZE, everything else is set arithmetic.
+    """
+    from .models import BookStatus, PhysicalBook
+
+    circulant = PhysicalBook.objects.filter(status=BookStatus.circulant)
+    if shelves is not None:
+        circulant = circulant.filter(shelf__in=shelves)
+
+    expected = {}
+    for physical_id, borrow_id in circulant.order_by().values_list('physical_id', 'current_borrow').iterator():
+        expected[physical_id] = borrow_id
+    on_loan = {physical_id for physical_id, borrow_id in expected.items() if borrow_id}
+
+    others = {}
+    for batch in _batches(scanned - expected.keys()):
+        others.update(PhysicalBook.objects.filter(physical_id__in=batch).order_by().values_list('physical_id', 'status'))
+
+    return Audit(
+        missing=sorted(expected.keys() - scanned - on_loan),
+        on_loan=sorted(on_loan - scanned),
+        scanned_on_loan=sorted(on_loan & scanned),
+        unexpected=sorted(others.items()),
+        unknown=sorted(scanned - expected.keys() - others.keys()),
+        invalid=list(invalid),
+        scanned=len(scanned),
+    )
+
+
+def mark_missing(physical_ids, status) -> int:
+    """
+    Sets the status of the copies `physical_ids` still circulant and not on loan to `status`, one
+    of MISSING_STATUSES, in one transaction. Returns how many copies changed.
+    """
+    from .circulation import apply_status_changes
+    from .models import BookStatus, PhysicalBook
+    from .search_cache import invalidate_filters
+
+    if status not in MISSING_STATUSES:
+        raise ValueError(f'Copies can not be marked {status} by an audit')
+
+    changed = 0
+    with transaction.atomic():
+        now = timezone.now()
+        for batch in _batches(physical_ids):
+            changed += PhysicalBook.objects.available().filter(physical_id__in=batch).update(
+                status=status, updated_at=now)
+
+        # `update` sends no signals, the status rollup is kept here
+        apply_status_changes(Counter({BookStatus.circulant.value: -changed, status: changed}))
+        transaction.on_commit(invalidate_filters)
+
+    return changed
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .search import compact_isbn
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataProviderError(Exception):
+    pass
+
+
+class GoogleBooksProvider:
+    api_url = 'https://www.googleapis.com/books/v1/volumes'
+
+    def lookup(self, isbn):
+        url = f'{self.api_url}?{urlencode({"q": f"isbn:{isbn}", "maxResults": 1})}'
+
+        try:
+            with urlopen(url, timeout=settings.ISBN_METADATA_TIMEOUT) as response:
+                data = json.load(response)
+        except (URLError, OSError, ValueError) as e:
+            raise MetadataProviderError(f'Google Books lookup of {isbn} failed: {e}') from e
+
+        if not data.get('items'):
+            return None
+
+        info = data['items'][0].get('volumeInfo', {})
+        published = info.get('publishedDate') or ''
+
+        return {
+            'isbn': isbn,
+            'title': info.get('title'),
+            'authors': info.get('authors', []),
+            'publisher': info.get('publisher'),
+            'year': int(published[:4]) if published[:4].isdigit() else None,
+            'page_count': info.get('pageCount'),
+        }
+
+
+class FileProvider:
+    """Reads metadata from the JSON object at ISBN_METADATA_FILE, keyed by ISBN. Meant for tests and offline use."""
+
+    def __init__(self):
+        with open(settings.ISBN_METADATA_FILE, encoding='utf-8') as file:
+            self.records = {compact_isbn(isbn): record for isbn, record in json.load(file).items()}
+
+    def lookup(self, isbn):
+        record = self.records.get(compact_isbn(isbn))
+        return dict(record, isbn=isbn) if record else None
+
+
+class MetadataStore:
+    """Persistent cache of provider answers, one JSON file per ISBN."""
+
+    def __init__(self, directory, negative_ttl):
+        self.directory = Path(directory)
+        self.negative_ttl = negative_ttl
+
+    def _path(self, isbn):
+        return self.directory / isbn[-2:] / f'{isbn}.json'
+
+    def get(self, isbn):
+        """Returns (found, metadata); metadata is None for ISBNs the provider does not know."""
+        try:
+            with open(self._path(isbn), encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return False, None
+
+        if entry['metadata'] is None and time.time() - entry['stored_at'] > self.negative_ttl:
+            return False, None
+
+        return True, entry['metadata']
+
+    def put(self, isbn, metadata):
+        path = self._path(isbn)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write aside and rename, so readers never see a partial file
+        descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump({'stored_at': time.time(), 'metadata': metadata}, file)
+        os.replace(temporary, path)
+
+
+class IsbnMetadataService:
+    def __init__(self, provider, store, max_workers):
+        self.provider = provider
+        self.store = store
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def lookup(self, isbn):
+        """Metadata of `isbn`, or None. Concurrent lookups of the same ISBN share one provider call."""
+        isbn = compact_isbn(isbn)
+        if not isbn:
+            return None
+        isbn = isbn.upper()
+
+        found, metadata = self.store.get(isbn)
+        if found:
+            return metadata
+
+        with self._lock:
+            future = self._pending.get(isbn)
+            owner = future is None
+            if owner:
+                future = self._pending[isbn] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            metadata = self.provider.lookup(isbn)
+            self.store.put(isbn, metadata)
+            future.set_result(metadata)
+            return metadata
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[isbn]
+
+    def lookup_many(self, isbns) -> dict:
+        """Looks up many ISBNs concurrently, at most `max_workers` at a time. Failed lookups map to None."""
+        isbns = list(dict.fromkeys(isbns))
+
+        def safe_lookup(isbn):
+            try:
+                return self.lookup(isbn)
+            except MetadataProviderError as e:
+                logger.warning(str(e))
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(isbns, executor.map(safe_lookup, isbns)))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> IsbnMetadataService:
+    global _service
+
+    with _service_lock:
+        if _service is None:
+            _service = IsbnMetadataService(
+                provider=import_string(settings.ISBN_METADATA_PROVIDER)(),
+                store=MetadataStore(settings.ISBN_METADATA_CACHE_DIR, settings.ISBN_METADATA_NEGATIVE_TTL),
+                max_workers=settings.ISBN_METADATA_WORKERS,
+            )
+
+    return _service
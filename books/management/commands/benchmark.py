@@ -0,0 +1,188 @@
+import json
+import statistics
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from books.models import Author, Book, Borrow, PhysicalBook, Reader
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures latency and query count of the public search, the admin changelists, the APIs and a '
+        'checkout, writing the results to a JSON file. Every request is rolled back, so the database is '
+        'left as it was. Meant for a catalog made by generate_library.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Measured runs of each scenario')
+        parser.add_argument('--output', help='JSON file to write, defaults to benchmark-<timestamp>.json')
+        parser.add_argument('--compare', help='JSON file of a previous run to print the difference to')
+        parser.add_argument('--only', help='Run only the scenarios whose name contains this text')
+
+    def handle(self, *args, **options):
+        if not Book.objects.exists():
+            raise CommandError('No books to measure, run generate_library first')
+
+        setup_test_environment()
+        # As in Django's TestCase, or the end of each request would close the connection mid-transaction
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+
+        try:
+            results = self.run_scenarios(options['runs'], options['only'])
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+            teardown_test_environment()
+
+        report = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'rows': {model._meta.model_name: model.objects.count()
+                     for model in (Book, PhysicalBook, Author, Reader, Borrow)},
+            'results': results,
+        }
+
+        output = options['output'] or f'benchmark-{datetime.now():%Y%m%d-%H%M%S}.json'
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def run_scenarios(self, runs, only) -> list:
+        self.runs = runs
+        self.client = Client()
+        results = []
+
+        for name, scenario in self.scenarios():
+            if only and only not in name:
+                continue
+
+            result = self.measure(name, scenario)
+            results.append(result)
+            self.stdout.write('{name:<50} {status:>4} {queries:>5} queries {median_ms:>9.1f} ms median '
+                              '{p95_ms:>9.1f} ms p95'.format(**result))
+
+        return results
+
+    def measure(self, name, scenario) -> dict:
+        timings = []
+        queries = status = None
+
+        for run in range(self.runs + 1):
+            try:
+                with transaction.atomic():
+                    self.client.force_login(self.user())
+                    caches['search'].clear()
+
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        status = scenario()
+                        elapsed = time.perf_counter() - started
+
+                    raise Rollback
+            except Rollback:
+                pass
+
+            # The first run only warms up connections and caches
+            if run:
+                timings.append(elapsed * 1000)
+                queries = len(captured)
+
+        timings.sort()
+        return {
+            'name': name,
+            'status': status,
+            'queries': queries,
+            'min_ms': timings[0],
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[min(len(timings) - 1, round(len(timings) * 0.95))],
+            'max_ms': timings[-1],
+            'runs': self.runs,
+        }
+
+    def user(self):
+        # Created inside the rolled back transaction of each run
+        return User.objects.create_superuser('benchmark', 'benchmark@example.com', None)
+
+    def get(self, url):
+        return lambda: self.client.get(url).status_code
+
+    def post(self, url, data):
+        return lambda: self.client.post(url, data, content_type='application/json').status_code
+
+    def checkout(self):
+        copy = PhysicalBook.objects.available().order_by('pk').first()
+        reader = Reader.objects.order_by('pk').first()
+
+        def checkout():
+            borrow = Borrow(book=PhysicalBook.objects.get(pk=copy.pk), reader_id=reader.pk)
+            borrow.full_clean()
+            borrow.save()
+            return 201
+
+        return checkout
+
+    def scenarios(self):
+        title = Book.objects.order_by('pk').values_list('title', flat=True).first()
+        author = Author.objects.order_by('pk').values_list('name', flat=True).first()
+        word = max(title.split(), key=len)
+
+        yield 'search: one word', self.get(f"{reverse('index')}?{urlencode({'search': word})}")
+        yield 'search: title', self.get(f"{reverse('index')}?{urlencode({'search': title})}")
+        yield 'search: author', self.get(f"{reverse('index')}?{urlencode({'search': author})}")
+        yield 'search: no match', self.get(f"{reverse('index')}?search=zzzzzz")
+
+        for model, model_admin in admin.site._registry.items():
+            if model._meta.app_label != 'books':
+                continue
+            url = reverse(f'admin:books_{model._meta.model_name}_changelist')
+            yield f'admin: {model._meta.model_name}', self.get(url)
+            if model_admin.search_fields:
+                yield f'admin: {model._meta.model_name} search', self.get(f'{url}?{urlencode({"q": word})}')
+
+        borrows = reverse('admin:books_borrow_changelist')
+        for query in ('late=late', 'late=on_time', 'status=borrowed', 'status=returned'):
+            yield f'admin: borrow {query}', self.get(f'{borrows}?{query}')
+        copies = reverse('admin:books_physicalbook_changelist')
+        for query in ('availability=available', 'availability=unavailable'):
+            yield f'admin: physicalbook {query}', self.get(f'{copies}?{query}')
+        yield 'admin: circulation dashboard', self.get(reverse('admin:books_borrow_dashboard'))
+
+        yield 'api: author get_or_create existing', self.post('/api/authors/get_or_create', {'name': author})
+        yield 'api: author get_or_create new', self.post('/api/authors/get_or_create', {'name': 'Benchmark Author'})
+        yield 'api: bulk get_or_create', self.post('/api/get_or_create', {
+            'authors': [author, 'Benchmark Author'], 'publishers': ['Benchmark Publisher']})
+        yield 'api: books list', self.get('/api/books/')
+        yield 'api: physical books available', self.get('/api/physical_books/?available=true')
+
+        yield 'checkout: clean and save', self.checkout()
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            previous = {result['name']: result for result in json.load(file)['results']}
+
+        self.stdout.write(f'\nCompared to {path}:')
+        for result in results:
+            before = previous.get(result['name'])
+            if before:
+                self.stdout.write('{:<50} {:>+6} queries {:>+8.1f}% median'.format(
+                    result['name'], result['queries'] - before['queries'],
+                    (result['median_ms'] / before['median_ms'] - 1) * 100 if before['median_ms'] else 0))
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from books.isbn_metadata import get_service
+from books.models import Author, Book, Publisher
+from books.search import index_books
+from books.text import normalize_name
+
+
+class Command(BaseCommand):
+    help = 'Fills missing year, page count, publisher and authors of books from their ISBN metadata.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Books looked up concurrently and saved together')
+        parser.add_argument('--limit', type=int, help='Stop after this many books')
+        parser.add_argument('--dry-run', action='store_true', help='Look up metadata without saving it')
+
+    def handle(self, *args, **options):
+        service = get_service()
+        incomplete = Book.objects.exclude(Q(isbn__isnull=True) | Q(isbn='')).filter(
+            Q(year__isnull=True) | Q(page_count__isnull=True) | Q(publisher__isnull=True) | Q(authors__isnull=True)
+        ).distinct().order_by('pk')
+
+        book_ids = list(incomplete.values_list('pk', flat=True))
+        if options['limit']:
+            book_ids = book_ids[:options['limit']]
+
+        stats = {'found': 0, 'updated': 0}
+        for start in range(0, len(book_ids), options['batch_size']):
+            books = list(Book.objects.filter(pk__in=book_ids[start:start + options['batch_size']])
+                         .select_related('publisher').prefetch_related('authors'))
+            metadata = service.lookup_many(book.isbn for book in books)
+            stats['found'] += sum(1 for record in metadata.values() if record)
+
+            if not options['dry_run']:
+                stats['updated'] += self.apply(books, metadata)
+
+            self.stdout.write(f'{min(start + options["batch_size"], len(book_ids))}/{len(book_ids)} books looked up')
+
+        self.stdout.write(self.style.SUCCESS('{found} ISBNs found, {updated} books updated'.format(**stats)))
+
+    def apply(self, books, metadata) -> int:
+        records = {book.pk: metadata.get(book.isbn) for book in books if metadata.get(book.isbn)}
+
+        # Publishers and authors of the whole batch, resolved in one lookup each
+        publisher_names = [records[book.pk]['publisher'] for book in books
+                           if book.pk in records and book.publisher is None and records[book.pk].get('publisher')]
+        author_names = [name for book in books if book.pk in records and not book.authors.all()
+                        for name in records[book.pk].get('authors') or ()]
+
+        updated = []
+        authors_added = []
+
+        with transaction.atomic():
+            publishers = {normalize_name(name): publisher for name, publisher in zip(
+                publisher_names, Publisher.objects.bulk_get_or_create(publisher_names))}
+            authors = {normalize_name(name): author for name, author in zip(
+                author_names, Author.objects.bulk_get_or_create(author_names))}
+
+            for book in books:
+                record = records.get(book.pk)
+                if not record:
+                    continue
+
+                changed = False
+                if book.year is None and record.get('year'):
+                    book.year, changed = record['year'], True
+                if not book.page_count and record.get('page_count'):
+                    book.page_count, changed = str(record['page_count']), True
+                if book.publisher is None and record.get('publisher'):
+                    book.publisher = publishers[normalize_name(record['publisher'])]
+                    changed = True
+
+                if changed:
+                    book.updated_at = timezone.now()
+                    updated.append(book)
+
+                if not book.authors.all() and record.get('authors'):
+                    for name in record['authors']:
+                        authors_added.append(Book.authors.through(
+                            book_id=book.pk, author_id=authors[normalize_name(name)].pk))
+
+            Book.objects.bulk_update(updated, ['year', 'page_count', 'publisher', 'updated_at'])
+            Book.authors.through.objects.bulk_create(authors_added, ignore_conflicts=True)
+            Book.objects.filter(pk__in={through.book_id for through in authors_added}).touch()
+            index_books({through.book_id for through in authors_added})
+
+        return len({book.pk for book in updated} | {through.book_id for through in authors_added})
@@ -0,0 +1,35 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from books import exports
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes the copies with their book details (physical_books) or the borrow history (borrows) as '
+        'CSV or JSON, reading and writing them chunk by chunk so memory stays flat however many rows there are.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=exports.EXPORTS, help='What to export')
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv', dest='output_format')
+        parser.add_argument('--gzip', action='store_true', help='Compresses the output with gzip')
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help='Only rows from this date on (YYYY-MM-DD): borrowed, or updated for copies')
+        parser.add_argument('--until', type=date.fromisoformat, help='Only rows up to this date (YYYY-MM-DD)')
+        parser.add_argument('--output', help='File to write, defaults to the standard output')
+
+    def handle(self, *args, **options):
+        blocks = exports.stream(
+            options['name'], options['output_format'], options['gzip'], options['since'], options['until'])
+
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                for block in blocks:
+                    file.write(block)
+        else:
+            for block in blocks:
+                sys.stdout.buffer.write(block)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,130 @@
+import csv
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books import duplicates
+from books.models import Author, Book, Collection, Publisher, Translator
+
+# Names are merged first, so books of merged authors have the same authors when they are compared
+MODELS = {
+    'author': Author,
+    'translator': Translator,
+    'publisher': Publisher,
+    'collection': Collection,
+    'book': Book,
+}
+
+FIELDS = ['model', 'keep_id', 'keep', 'remove_id', 'remove', 'score', 'block', 'merge']
+
+
+class Command(BaseCommand):
+    help = (
+        'Finds near duplicate books, authors, translators, publishers and collections, comparing only '
+        'records that share a blocking key (ISBN, title words and author, name words...), and writes '
+        'them to a CSV report to review. Pairs scoring --auto-merge or more are marked to merge. '
+        'With --merge, merges the pairs marked "yes" in a reviewed report.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=MODELS, default=list(MODELS), help='What to look at')
+        parser.add_argument('--threshold', type=float, default=0.85, help='Least score of a reported pair, 0 to 1')
+        parser.add_argument('--auto-merge', type=float, default=0.95, help='Least score of a pair marked to merge')
+        parser.add_argument('--output', help='CSV report to write, defaults to duplicates-<timestamp>.csv')
+        parser.add_argument('--merge', metavar='REPORT', help='Merges the pairs marked "yes" in this report')
+
+    def handle(self, *args, **options):
+        if options['merge']:
+            self.merge(options['merge'])
+        else:
+            self.report(options)
+
+    def report(self, options):
+        output = options['output'] or f'duplicates-{datetime.now():%Y%m%d-%H%M%S}.csv'
+
+        with open(output, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(FIELDS)
+
+            for name, model in MODELS.items():
+                if name not in options['models']:
+                    continue
+
+                if model is Book:
+                    candidates = duplicates.find_book_duplicates(options['threshold'])
+                else:
+                    candidates = duplicates.find_named_duplicates(model, options['threshold'])
+
+                objs = self.load(model, {pk for candidate in candidates for pk in (candidate.keep, candidate.remove)})
+                for candidate in candidates:
+                    writer.writerow([
+                        name, candidate.keep, objs[candidate.keep], candidate.remove, objs[candidate.remove],
+                        f'{candidate.score:.3f}', candidate.block,
+                        'yes' if candidate.score >= options['auto_merge'] else 'no',
+                    ])
+                self.stdout.write(f'{len(candidates)} possible duplicate {model._meta.verbose_name_plural}')
+
+        self.stdout.write(self.style.SUCCESS(f'Report written to {output}, review it and run --merge {output}'))
+
+    @staticmethod
+    def load(model, pks) -> dict:
+        objs = {}
+        queryset = model.objects.filter(pk__in=pks)
+        if model is Book:
+            queryset = queryset.prefetch_related('authors')
+        for obj in queryset:
+            objs[obj.pk] = f'{obj} | {obj.authors_str()}' if model is Book else str(obj)
+        return objs
+
+    def merge(self, path):
+        pairs = {name: [] for name in MODELS}
+        with open(path, encoding='utf-8', newline='') as file:
+            for row in csv.DictReader(file):
+                if row['model'] not in MODELS:
+                    raise CommandError(f'Unknown model {row["model"]} in {path}')
+                if row['merge'].strip().lower() == 'yes':
+                    pairs[row['model']].append((int(row['keep_id']), int(row['remove_id'])))
+
+        for name, model in MODELS.items():
+            groups = self.groups(pairs[name])
+            existing = set(model.objects.filter(pk__in=[pk for group in groups for pk in group]).values_list(
+                'pk', flat=True))
+
+            merged = 0
+            for group in groups:
+                # Records gone since the report (merged or deleted) are left out
+                group = sorted(pk for pk in group if pk in existing)
+                if len(group) < 2:
+                    continue
+
+                # The oldest record is kept
+                keep, remove = group[0], group[1:]
+                if model is Book:
+                    duplicates.merge_books(keep, remove)
+                else:
+                    duplicates.merge_named(model, keep, remove)
+                merged += len(remove)
+
+            if pairs[name]:
+                self.stdout.write(f'{merged} {model._meta.verbose_name_plural} merged')
+
+        self.stdout.write(self.style.SUCCESS('Merge finished'))
+
+    @staticmethod
+    def groups(pairs) -> list:
+        """Connected groups of the pairs, so A=B and B=C merge A, B and C together."""
+        parent = {}
+
+        def root(pk):
+            while parent.setdefault(pk, pk) != pk:
+                parent[pk] = parent[parent[pk]]
+                pk = parent[pk]
+            return pk
+
+        for first, second in pairs:
+            parent[root(first)] = root(second)
+
+        groups = {}
+        for pk in parent:
+            groups.setdefault(root(pk), []).append(pk)
+        return list(groups.values())
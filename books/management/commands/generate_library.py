@@ -0,0 +1,257 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books import circulation, subjects
+from books.bulk import bulk_create_with_pks
+from books.models import (Author, Book, BookStatus, Borrow, Collection, PhysicalBook, Publisher, Reader, Shelf,
+                          Translator)
+from books.search import index_books
+from books.text import normalize_name
+
+# Sizes at --scale 1, close to a large public library
+SIZES = {
+    'books': 200_000,
+    'copies': 300_000,
+    'readers': 50_000,
+    'borrows': 2_000_000,
+    'authors': 40_000,
+    'translators': 5_000,
+    'publishers': 2_000,
+    'collections': 1_000,
+    'shelves': 1_000,
+}
+
+FIRST_NAMES = (
+    'Ana', 'Antônio', 'Beatriz', 'Bruno', 'Carla', 'Carlos', 'Cecília', 'Clarice', 'Daniel', 'Débora', 'Eduardo',
+    'Elisa', 'Fábio', 'Fernanda', 'Gabriel', 'Graciliano', 'Helena', 'Hugo', 'Isabel', 'Jorge', 'José', 'Júlia',
+    'Lúcia', 'Luís', 'Machado', 'Márcia', 'Mário', 'Nélida', 'Otávio', 'Paulo', 'Rachel', 'Raquel', 'Renato',
+    'Rubem', 'Sérgio', 'Sílvia', 'Tereza', 'Vinícius', 'Wagner', 'Zélia',
+)
+MIDDLE_NAMES = (
+    'Alves', 'Amado', 'Andrade', 'Araújo', 'Barbosa', 'Barros', 'Braga', 'Campos', 'Cardoso', 'Carvalho', 'Castro',
+    'Costa', 'Cunha', 'Dias', 'Duarte', 'Faria', 'Fonseca', 'Freitas', 'Gomes', 'Lima', 'Lins', 'Lopes', 'Machado',
+    'Martins', 'Meireles', 'Melo', 'Mendes', 'Moraes', 'Moreira', 'Nunes', 'Pereira', 'Pinto', 'Queiroz', 'Ramos',
+    'Rocha', 'Santos', 'Souza', 'Teixeira', 'Vieira', 'Xavier',
+)
+LAST_NAMES = MIDDLE_NAMES + (
+    'Assis', 'Bandeira', 'Drummond', 'Fagundes', 'Guimarães', 'Lispector', 'Ramos', 'Rosa', 'Suassuna', 'Telles',
+)
+WORDS = (
+    'amor', 'água', 'alma', 'anos', 'arte', 'aurora', 'azul', 'barco', 'caminho', 'campo', 'canção', 'casa',
+    'céu', 'cidade', 'coração', 'corpo', 'crônica', 'dia', 'estrela', 'fogo', 'flor', 'guerra', 'história',
+    'homem', 'ilha', 'jardim', 'livro', 'lua', 'luz', 'mar', 'memória', 'menino', 'mundo', 'noite', 'olhos',
+    'palavra', 'pedra', 'poema', 'ponte', 'rio', 'rua', 'sertão', 'silêncio', 'sol', 'sombra', 'sonho', 'tempo',
+    'terra', 'vento', 'viagem', 'vida', 'voz',
+)
+SUBJECTS = (
+    'Literatura brasileira', 'Poesia', 'Romance', 'Contos', 'Crônicas', 'História do Brasil', 'Geografia',
+    'Filosofia', 'Psicologia', 'Religião', 'Ciências sociais', 'Educação', 'Matemática', 'Física', 'Química',
+    'Biologia', 'Medicina', 'Engenharia', 'Agricultura', 'Culinária', 'Artes', 'Música', 'Esportes', 'Biografias',
+    'Literatura infantil', 'Literatura estrangeira', 'Teatro', 'Direito', 'Economia', 'Linguística',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills an empty database with a synthetic library, for profiling and benchmarks. '
+        'The same seed and scale always produce the same catalog.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'Multiplier of the default sizes: {", ".join(f"{k} {v}" for k, v in SIZES.items())}')
+        for name in SIZES:
+            parser.add_argument(f'--{name}', type=int, help=f'Number of {name}, overriding --scale')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--open-ratio', type=float, default=0.1, help='Share of copies currently on loan')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per insert and transaction')
+
+    def handle(self, *args, **options):
+        if Book.objects.exists() or Borrow.objects.exists():
+            raise CommandError('The database already has a catalog, generate_library needs an empty one')
+
+        self.sizes = {name: options[name] if options[name] is not None else max(1, int(size * options['scale']))
+                      for name, size in SIZES.items()}
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = date.today()
+        started = time.monotonic()
+
+        with transaction.atomic():
+            self.publishers = self.create_named(Publisher, self.sizes['publishers'], self.company_name)
+            self.collections = self.create_named(Collection, self.sizes['collections'], self.collection_name)
+            self.authors = self.create_named(Author, self.sizes['authors'], self.person_name)
+            self.translators = self.create_named(Translator, self.sizes['translators'], self.person_name)
+            self.shelves = self.create_shelves()
+            self.readers = self.create_readers()
+
+        self.create_books()
+        self.create_copies()
+        self.create_borrows(options['open_ratio'])
+
+        self.stdout.write('Indexing books for search...')
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        for start in range(0, len(book_ids), self.batch_size):
+            index_books(book_ids[start:start + self.batch_size])
+
+        call_command('rebuild_availability', stdout=self.stdout)
+        circulation.rebuild()
+        subjects.rebuild()
+
+        self.stdout.write(self.style.SUCCESS('Library generated in {:.0f}s: {}'.format(
+            time.monotonic() - started, ', '.join(f'{size} {name}' for name, size in self.sizes.items()))))
+
+    def unique_names(self, count, parts):
+        """`count` distinct combinations of one item of each of `parts`, in a seeded order."""
+        total = 1
+        for part in parts:
+            total *= len(part)
+
+        for index in self.rng.sample(range(total), min(count, total)):
+            name = []
+            for part in parts:
+                index, item = divmod(index, len(part))
+                name.append(part[item])
+            yield name
+
+        # Past the combinations, disambiguate by number
+        for number in range(total, count):
+            yield [*(part[number % len(part)] for part in parts), str(number)]
+
+    def person_name(self, count):
+        return (' '.join(name) for name in self.unique_names(count, (FIRST_NAMES, MIDDLE_NAMES, LAST_NAMES)))
+
+    def company_name(self, count):
+        return ('Editora ' + ' '.join(name).title() for name in self.unique_names(count, (WORDS, WORDS)))
+
+    def collection_name(self, count):
+        return ('Coleção ' + ' '.join(name).title() for name in self.unique_names(count, (WORDS, LAST_NAMES)))
+
+    def create_named(self, model, count, names) -> list:
+        objs = [model(name=name, name_key=normalize_name(name)) for name in names(count)]
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.stdout.write(f'{len(objs)} {model._meta.verbose_name_plural} created')
+        return list(model.objects.order_by('pk').values_list('pk', flat=True))
+
+    def create_shelves(self) -> list:
+        shelves = [
+            Shelf(ddc=f'{self.rng.randrange(1000):03d}.{self.rng.randrange(100):02d}',
+                  description=f'{self.rng.choice(SUBJECTS)} {number + 1}')
+            for number in range(self.sizes['shelves'])
+        ]
+        Shelf.objects.bulk_create(shelves, batch_size=self.batch_size)
+        self.stdout.write(f'{len(shelves)} shelves created')
+        return list(Shelf.objects.order_by('pk').values_list('pk', flat=True))
+
+    def create_readers(self) -> list:
+        names = (' '.join((self.rng.choice(FIRST_NAMES), self.rng.choice(MIDDLE_NAMES), self.rng.choice(LAST_NAMES)))
+                 for _ in range(self.sizes['readers']))
+        readers = [
+            Reader(name=name, name_key=normalize_name(name),
+                   document=f'{self.rng.randrange(10 ** 11):011d}',
+                   contact=f'(11) 9{self.rng.randrange(10 ** 8):08d}',
+                   observation='')
+            for name in names
+        ]
+        Reader.objects.bulk_create(readers, batch_size=self.batch_size)
+        self.stdout.write(f'{len(readers)} readers created')
+        return list(Reader.objects.order_by('pk').values_list('pk', flat=True))
+
+    def isbn(self):
+        digits = [9, 7, 8] + [self.rng.randrange(10) for _ in range(9)]
+        check = (10 - sum(digit * (3 if i % 2 else 1) for i, digit in enumerate(digits)) % 10) % 10
+        return ''.join(map(str, digits + [check]))
+
+    def create_books(self):
+        rng = self.rng
+        for start in range(0, self.sizes['books'], self.batch_size):
+            books, authors, translators = [], [], []
+
+            for _ in range(min(self.batch_size, self.sizes['books'] - start)):
+                words = rng.sample(WORDS, rng.randint(1, 4))
+                books.append(Book(
+                    title=' '.join(words).capitalize(),
+                    isbn=self.isbn() if rng.random() < 0.7 else None,
+                    publisher_id=rng.choice(self.publishers) if rng.random() < 0.9 else None,
+                    collection_id=rng.choice(self.collections) if rng.random() < 0.2 else None,
+                    volume=str(rng.randint(1, 5)) if rng.random() < 0.05 else None,
+                    edition=rng.randint(1, 10) if rng.random() < 0.5 else None,
+                    year=rng.randint(1900, self.today.year) if rng.random() < 0.9 else None,
+                    page_count=str(rng.randint(40, 900)),
+                ))
+                authors.append(rng.sample(self.authors, min(len(self.authors), rng.choice((1, 1, 1, 2, 3)))))
+                translators.append(rng.sample(self.translators, 1) if rng.random() < 0.15 else [])
+
+            with transaction.atomic():
+                bulk_create_with_pks(Book, books, batch_size=self.batch_size)
+                Book.authors.through.objects.bulk_create([
+                    Book.authors.through(book_id=book.pk, author_id=author_id)
+                    for book, author_ids in zip(books, authors) for author_id in author_ids
+                ], batch_size=self.batch_size)
+                Book.translators.through.objects.bulk_create([
+                    Book.translators.through(book_id=book.pk, translator_id=translator_id)
+                    for book, translator_ids in zip(books, translators) for translator_id in translator_ids
+                ], batch_size=self.batch_size)
+
+            self.stdout.write(f'{start + len(books)}/{self.sizes["books"]} books created')
+
+    def create_copies(self):
+        rng = self.rng
+        book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+        statuses = (BookStatus.circulant,) * 90 + (BookStatus.not_circulant,) * 4 + (BookStatus.archived,) * 3 + \
+            (BookStatus.lost_by_user,) * 2 + (BookStatus.defective,)
+        physical_ids = iter(PhysicalBook.allocate_physical_ids(self.sizes['copies']))
+
+        # Every book gets a copy first, the rest go to random books
+        for start in range(0, self.sizes['copies'], self.batch_size):
+            copies = [
+                PhysicalBook(
+                    physical_id=next(physical_ids),
+                    book_id=book_ids[number] if number < len(book_ids) else rng.choice(book_ids),
+                    shelf_id=rng.choice(self.shelves),
+                    status=rng.choice(statuses),
+                )
+                for number in range(start, min(start + self.batch_size, self.sizes['copies']))
+            ]
+            PhysicalBook.objects.bulk_create(copies, batch_size=self.batch_size)
+            self.stdout.write(f'{start + len(copies)}/{self.sizes["copies"]} copies created')
+
+    def create_borrows(self, open_ratio):
+        """Walks back in time from today through the loans of each copy, so no copy is lent twice at once."""
+        rng = self.rng
+        copy_ids = list(PhysicalBook.objects.order_by('pk').values_list('pk', flat=True))
+        loan_period = timedelta(days=settings.LOAN_PERIOD_DAYS)
+
+        per_copy, extra = divmod(self.sizes['borrows'], len(copy_ids))
+        borrows = []
+        created = 0
+
+        for number, copy_id in enumerate(copy_ids):
+            end = self.today
+            for loan in range(per_copy + (1 if number < extra else 0)):
+                is_open = loan == 0 and rng.random() < open_ratio
+                length = rng.randint(1, 30)
+                date_borrow = end - timedelta(days=length if is_open else length + rng.randint(0, 20))
+                renew_count = rng.choice((0, 0, 0, 0, 1, 2))
+
+                borrows.append(Borrow(
+                    book_id=copy_id, reader_id=rng.choice(self.readers), date_borrow=date_borrow,
+                    date_return=None if is_open else date_borrow + timedelta(days=length),
+                    renew_count=renew_count, due_date=date_borrow + loan_period * (renew_count + 1),
+                ))
+                end = date_borrow - timedelta(days=rng.randint(0, 15))
+
+            if len(borrows) >= self.batch_size:
+                Borrow.objects.bulk_create(borrows, batch_size=self.batch_size)
+                created += len(borrows)
+                borrows = []
+                self.stdout.write(f'{created}/{self.sizes["borrows"]} borrows created')
+
+        Borrow.objects.bulk_create(borrows, batch_size=self.batch_size)
+        self.stdout.write(f'{self.sizes["borrows"]}/{self.sizes["borrows"]} borrows created')
@@ -0,0 +1,325 @@
+import csv
+import hashlib
+import json
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books import subjects
+from books.bulk import bulk_create_with_pks
+from books.circulation import apply_status_changes
+from books.models import (Author, Book, BookStatus, Collection, PhysicalBook,
+                          Publisher, Sequence, Shelf, Translator)
+from books.search import compact_isbn, index_books
+from books.text import normalize_name
+
+COLUMNS = (
+    'title', 'isbn', 'authors', 'translators', 'publisher', 'collection', 'volume', 'edition', 'local',
+    'year', 'page_count', 'pha', 'physical_ids', 'copies', 'shelf_ddc', 'shelf_description', 'status',
+    'observations',
+)
+
+
+def _text(value):
+    value = str(value).strip() if value is not None else ''
+    return value or None
+
+
+def _integer(value):
+    value = _text(value)
+    return int(value) if value is not None else None
+
+
+class NameResolver:
+    """Maps names to primary keys of `model`, creating the missing rows in bulk."""
+
+    def __init__(self, model):
+        self.model = model
+        self.pks = dict(model.objects.values_list('name_key', 'pk').iterator())
+        self.created = 0
+
+    def resolve(self, names):
+        missing = {}
+        for name in names:
+            key = normalize_name(name)
+            if key not in self.pks and key not in missing:
+                missing[key] = name
+
+        for obj in self.model.objects.bulk_get_or_create(list(missing.values())):
+            self.pks[obj.name_key] = obj.pk
+
+        self.created += len(missing)
+
+    def __getitem__(self, name):
+        return self.pks[normalize_name(name)]
+
+
+class ShelfResolver:
+    def __init__(self):
+        self.pks = {
+            self.key(ddc, description): pk
+            for pk, ddc, description in Shelf.objects.values_list('pk', 'ddc', 'description').iterator()
+        }
+        self.created = 0
+
+    @staticmethod
+    def key(ddc, description):
+        return (ddc or '').strip(), normalize_name(description or '')
+
+    def resolve(self, shelves):
+        missing = {}
+        for ddc, description in shelves:
+            key = self.key(ddc, description)
+            if key not in self.pks and key not in missing:
+                missing[key] = Shelf(ddc=ddc, description=description or '', subject_key=subjects.ddc_key(ddc))
+
+        for key, obj in zip(missing, bulk_create_with_pks(Shelf, list(missing.values()))):
+            self.pks[key] = obj.pk
+
+        self.created += len(missing)
+
+    def get(self, ddc, description):
+        if not ddc and not description:
+            return None
+        return self.pks[self.key(ddc, description)]
+
+
+def fingerprint(title, volume, edition, isbn, publisher_id, collection_id, year, author_ids) -> bytes:
+    """Hash identifying a book, so the same title can be imported twice without duplicates."""
+    data = json.dumps([
+        normalize_name(title), normalize_name(volume or ''), edition, compact_isbn(isbn),
+        publisher_id, collection_id, year, sorted(author_ids),
+    ])
+    return hashlib.sha1(data.encode()).digest()
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports books and their physical copies from a CSV or JSON Lines file. '
+        f'Recognized columns: {", ".join(COLUMNS)}. Lists (authors, translators, physical_ids) '
+        'are separated by --list-separator in CSV files and may be JSON arrays in JSON Lines files. '
+        'Books already in the catalog are recognized by a hash of their data and reused, '
+        'their copies are still added.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - to read from the standard input')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Defaults to the file extension')
+        parser.add_argument('--delimiter', default=',', help='CSV column delimiter')
+        parser.add_argument('--list-separator', default='|', help='Separator of list values in CSV files')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows written per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        if path == '-' and not options['format']:
+            raise CommandError('--format is required when reading from the standard input')
+
+        self.list_separator = options['list_separator']
+        self.started = time.monotonic()
+        self.stats = {'rows': 0, 'books': 0, 'duplicates': 0, 'copies': 0, 'skipped_copies': 0, 'errors': 0}
+
+        self.load_lookups()
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            rows = self.read_rows(stream, input_format, options['delimiter'])
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+
+                self.import_chunk(chunk)
+                self.report()
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Import finished: {books} books, {copies} copies, {duplicates} duplicated books, '
+            '{errors} rejected rows, {skipped_copies} skipped copies'.format(**self.stats)))
+        self.stdout.write('Created {} publishers, {} authors, {} translators, {} collections, {} subjects'.format(
+            self.publishers.created, self.authors.created, self.translators.created,
+            self.collections.created, self.shelves.created))
+
+    def load_lookups(self):
+        self.stdout.write('Loading existing catalog...')
+
+        self.publishers = NameResolver(Publisher)
+        self.authors = NameResolver(Author)
+        self.translators = NameResolver(Translator)
+        self.collections = NameResolver(Collection)
+        self.shelves = ShelfResolver()
+
+        book_authors = {}
+        for book_id, author_id in Book.authors.through.objects.values_list('book_id', 'author_id').iterator():
+            book_authors.setdefault(book_id, []).append(author_id)
+
+        self.books = {}
+        for pk, title, volume, edition, isbn, publisher_id, collection_id, year in Book.objects.values_list(
+                'pk', 'title', 'volume', 'edition', 'isbn', 'publisher_id', 'collection_id', 'year').iterator():
+            key = fingerprint(title, volume, edition, isbn, publisher_id, collection_id, year,
+                              book_authors.get(pk, []))
+            self.books[key] = pk
+
+        self.physical_ids = set(PhysicalBook.objects.values_list('physical_id', flat=True).iterator())
+
+    def read_rows(self, stream, input_format, delimiter):
+        if input_format == 'csv':
+            for line, row in enumerate(csv.DictReader(stream, delimiter=delimiter), start=2):
+                yield line, row
+        else:
+            for line, text in enumerate(stream, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError as e:
+                        yield line, e
+
+    def split(self, value) -> list:
+        if isinstance(value, (list, tuple)):
+            values = value
+        else:
+            values = (value or '').split(self.list_separator)
+        return [str(item).strip() for item in values if str(item).strip()]
+
+    def parse(self, row) -> dict:
+        if isinstance(row, Exception):
+            raise ValueError(row)
+
+        data = {
+            'title': _text(row.get('title')),
+            'isbn': _text(row.get('isbn')),
+            'authors': self.split(row.get('authors')),
+            'translators': self.split(row.get('translators')),
+            'publisher': _text(row.get('publisher')),
+            'collection': _text(row.get('collection')),
+            'volume': _text(row.get('volume')),
+            'edition': _integer(row.get('edition')),
+            'local': _text(row.get('local')),
+            'year': _integer(row.get('year')),
+            'page_count': _text(row.get('page_count')),
+            'pha': _text(row.get('pha')),
+            'physical_ids': [int(value) for value in self.split(row.get('physical_ids'))],
+            'copies': _integer(row.get('copies')) or 0,
+            'shelf_ddc': _text(row.get('shelf_ddc')),
+            'shelf_description': _text(row.get('shelf_description')),
+            'status': _text(row.get('status')) or BookStatus.circulant,
+            'observations': _text(row.get('observations')),
+        }
+
+        if not data['title']:
+            raise ValueError('missing title')
+
+        if data['status'] not in BookStatus.values:
+            raise ValueError(f"unknown status {data['status']}")
+
+        return data
+
+    def import_chunk(self, chunk):
+        rows = []
+        for line, row in chunk:
+            self.stats['rows'] += 1
+            try:
+                rows.append(self.parse(row))
+            except ValueError as e:
+                self.stats['errors'] += 1
+                self.stderr.write(f'Line {line} rejected: {e}')
+
+        self.reserve_physical_ids(rows)
+
+        with transaction.atomic():
+            self.publishers.resolve(row['publisher'] for row in rows if row['publisher'])
+            self.collections.resolve(row['collection'] for row in rows if row['collection'])
+            self.authors.resolve(name for row in rows for name in row['authors'])
+            self.translators.resolve(name for row in rows for name in row['translators'])
+            self.shelves.resolve((row['shelf_ddc'], row['shelf_description'])
+                                 for row in rows if row['shelf_ddc'] or row['shelf_description'])
+
+            new_books = {}
+            row_books = []
+            for row in rows:
+                publisher_id = self.publishers[row['publisher']] if row['publisher'] else None
+                collection_id = self.collections[row['collection']] if row['collection'] else None
+                author_ids = list(dict.fromkeys(self.authors[name] for name in row['authors']))
+                key = fingerprint(row['title'], row['volume'], row['edition'], row['isbn'],
+                                  publisher_id, collection_id, row['year'], author_ids)
+
+                if key in self.books or key in new_books:
+                    self.stats['duplicates'] += 1
+                else:
+                    new_books[key] = (Book(
+                        title=row['title'], isbn=row['isbn'], volume=row['volume'], edition=row['edition'],
+                        local=row['local'], publisher_id=publisher_id, collection_id=collection_id,
+                        year=row['year'], page_count=row['page_count'], pha=row['pha'],
+                    ), author_ids, list(dict.fromkeys(self.translators[name] for name in row['translators'])))
+                row_books.append(key)
+
+            bulk_create_with_pks(Book, [book for book, _, _ in new_books.values()])
+            for key, (book, _, _) in new_books.items():
+                self.books[key] = book.pk
+
+            Book.authors.through.objects.bulk_create([
+                Book.authors.through(book_id=book.pk, author_id=author_id)
+                for book, author_ids, _ in new_books.values() for author_id in author_ids
+            ], batch_size=1000)
+            Book.translators.through.objects.bulk_create([
+                Book.translators.through(book_id=book.pk, translator_id=translator_id)
+                for book, _, translator_ids in new_books.values() for translator_id in translator_ids
+            ], batch_size=1000)
+
+            copies = bulk_create_with_pks(PhysicalBook, self.copies(rows, row_books), batch_size=1000)
+            apply_status_changes(Counter(copy.status for copy in copies))
+            subject_keys = dict(Shelf.objects.filter(
+                pk__in={copy.shelf_id for copy in copies}).values_list('pk', 'subject_key'))
+            subjects.apply_changes(subjects.copy_changes(
+                added=[(copy.pk, copy.book_id, subject_keys.get(copy.shelf_id)) for copy in copies]))
+
+            index_books(book.pk for book, _, _ in new_books.values())
+
+        self.stats['books'] += len(new_books)
+
+    def reserve_physical_ids(self, rows):
+        # Done outside the chunk transaction, so the counter is not locked while the chunk is written
+        given = [physical_id for row in rows for physical_id in row['physical_ids']]
+        if given:
+            Sequence.advance(PhysicalBook.ID_SEQUENCE, max(given))
+
+        missing = sum(max(row['copies'] - len(row['physical_ids']), 0) for row in rows)
+        self.free_physical_ids = iter(PhysicalBook.allocate_physical_ids(missing) if missing else ())
+
+    def copies(self, rows, row_books) -> list:
+        copies = []
+
+        for row, key in zip(rows, row_books):
+            physical_ids = []
+            for physical_id in row['physical_ids']:
+                if physical_id in self.physical_ids:
+                    self.stats['skipped_copies'] += 1
+                    self.stderr.write(f'Physical ID {physical_id} already exists, copy of "{row["title"]}" skipped')
+                else:
+                    physical_ids.append(physical_id)
+                    self.physical_ids.add(physical_id)
+
+            for _ in range(row['copies'] - len(row['physical_ids'])):
+                physical_id = next(self.free_physical_ids)
+                physical_ids.append(physical_id)
+                self.physical_ids.add(physical_id)
+
+            shelf_id = self.shelves.get(row['shelf_ddc'], row['shelf_description'])
+            copies.extend(PhysicalBook(
+                physical_id=physical_id, book_id=self.books[key], shelf_id=shelf_id,
+                status=row['status'], observations=row['observations'],
+            ) for physical_id in physical_ids)
+
+        self.stats['copies'] += len(copies)
+        return copies
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write('{rows} rows read, {books} books and {copies} copies created'.format(**self.stats) +
+                          f' ({self.stats["rows"] / elapsed:.0f} rows/s)')
@@ -0,0 +1,58 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books import inventory
+from books.models import Shelf
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares a file of scanned physical IDs, one per line ("-" reads the standard input), with the '
+        'circulant copies and lists, as CSV, the missing ones, those on loan, those scanned while on loan, '
+        'the scanned ones that are not circulant and the unknown IDs. With --mark-missing, sets the status '
+        'of the missing copies.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scans', help='File of scanned physical IDs')
+        parser.add_argument('--shelves', nargs='+', type=int, metavar='SHELF_ID',
+                            help='Only expects the copies of these shelves')
+        parser.add_argument('--mark-missing', choices=inventory.MISSING_STATUSES,
+                            help='Status to set on the missing copies')
+
+    def handle(self, *args, **options):
+        shelves = None
+        if options['shelves']:
+            shelves = list(Shelf.objects.filter(pk__in=options['shelves']))
+            if len(shelves) != len(set(options['shelves'])):
+                raise CommandError('Unknown shelf')
+
+        invalid = []
+        if options['scans'] == '-':
+            scanned = inventory.parse_ids(sys.stdin, invalid)
+        else:
+            with open(options['scans'], 'rb') as file:
+                scanned = inventory.parse_ids(file, invalid)
+
+        result = inventory.audit(scanned, shelves, invalid)
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(['result', 'physical_id', 'status'])
+        for name in ('missing', 'on_loan', 'scanned_on_loan', 'unknown'):
+            for physical_id in getattr(result, name):
+                writer.writerow([name, physical_id, ''])
+        for physical_id, status in result.unexpected:
+            writer.writerow(['unexpected', physical_id, status])
+        for number, line in result.invalid:
+            self.stderr.write(f'Line {number} holds no physical ID: {line}')
+
+        self.stderr.write(
+            f'{result.scanned} scanned, {len(result.missing)} missing, {len(result.on_loan)} on loan, '
+            f'{len(result.scanned_on_loan)} scanned on loan, {len(result.unexpected)} unexpected, '
+            f'{len(result.unknown)} unknown')
+
+        if options['mark_missing']:
+            changed = inventory.mark_missing(result.missing, options['mark_missing'])
+            self.stderr.write(self.style.SUCCESS(f'{changed} copies marked {options["mark_missing"]}'))
@@ -0,0 +1,35 @@
+import csv
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import datetime
+
+from books.models import Borrow
+
+
+class Command(BaseCommand):
+    help = 'Lists the open borrows past their due date, oldest first, as CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-days', type=int, default=1, help='Only borrows overdue for at least this many days')
+        parser.add_argument('--date', type=datetime.fromisoformat, help='Report as of this date (YYYY-MM-DD), defaults to today')
+
+    def handle(self, *args, **options):
+        today = options['date'].date() if options['date'] else datetime.today().date()
+
+        overdue = Borrow.objects.overdue(today).filter(
+            due_date__lte=today - timedelta(days=options['min_days'])
+        ).select_related('reader', 'book__book').order_by('due_date', 'pk')
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(['due_date', 'days_overdue', 'physical_id', 'title', 'reader', 'document', 'contact'])
+
+        count = 0
+        for borrow in overdue.iterator():
+            writer.writerow([
+                borrow.due_date.isoformat(), (today - borrow.due_date).days, borrow.book.physical_id, borrow.book.book.title,
+                borrow.reader.name, borrow.reader.document or '', borrow.reader.contact or '',
+            ])
+            count += 1
+
+        self.stderr.write(f'{count} overdue borrows')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Now
+
+from books.models import Borrow, PhysicalBook
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the current borrow of every physical book from the borrow history.'
+
+    def handle(self, *args, **options):
+        open_borrow = Borrow.objects.filter(book=OuterRef('pk'), date_return__isnull=True).order_by(
+            '-date_borrow', '-pk').values('pk')[:1]
+
+        with transaction.atomic():
+            PhysicalBook.objects.update(current_borrow=Subquery(open_borrow), updated_at=Now())
+
+        on_loan = PhysicalBook.objects.filter(current_borrow__isnull=False).count()
+        self.stdout.write(self.style.SUCCESS(f'Availability rebuilt, {on_loan} books on loan'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from books import circulation
+from books.models import DailyCirculation, StatusCount
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily circulation and status count rollups behind the circulation dashboard.'
+
+    def handle(self, *args, **options):
+        circulation.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Circulation stats rebuilt, {DailyCirculation.objects.count()} daily rows, '
+            f'{StatusCount.objects.count()} statuses'))
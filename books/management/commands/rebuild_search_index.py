@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.search import INDEX_BATCH_SIZE, index_books
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search document of every book. Needed after bulk changes that skip model signals.'
+
+    def handle(self, *args, **options):
+        book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+        changed = 0
+
+        for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+            changed += len(index_books(book_ids[start:start + INDEX_BATCH_SIZE]))
+            self.stdout.write(f'{min(start + INDEX_BATCH_SIZE, len(book_ids))}/{len(book_ids)} books indexed')
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt, {changed} terms changed'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from books import subjects
+from books.models import SubjectNode
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the DDC subject hierarchy and its copy and title counts from the shelves and copies.'
+
+    def handle(self, *args, **options):
+        subjects.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f'Subjects rebuilt, {SubjectNode.objects.count()} nodes'))
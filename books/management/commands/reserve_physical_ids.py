@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.models import PhysicalBook
+
+
+class Command(BaseCommand):
+    help = 'Reserves a block of consecutive physical IDs, e.g. to print labels ahead of cataloguing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='How many IDs to reserve')
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError('count must be positive')
+
+        physical_ids = PhysicalBook.allocate_physical_ids(options['count'])
+        self.stdout.write(self.style.SUCCESS(f'Reserved physical IDs {physical_ids[0]} to {physical_ids[-1]}'))
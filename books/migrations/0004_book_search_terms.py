@@ -0,0 +1,148 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:23
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Copied from `books.text` and `books.search` as they were, so this migration builds the same
+# index however they change later
+INDEX_BATCH_SIZE = 500
+TERM_MAX_LENGTH = 64
+
+WEIGHT_ISBN = 16
+WEIGHT_TITLE = 8
+WEIGHT_AUTHOR = 4
+WEIGHT_COLLECTION = 2
+WEIGHT_TRANSLATOR = 1
+WEIGHT_OBSERVATION = 1
+
+_STEM_RULES = (
+    ('mente', ''),
+    ('oes', 'ao'),
+    ('aes', 'ao'),
+    ('ais', 'al'),
+    ('eis', 'el'),
+    ('ois', 'ol'),
+    ('res', 'r'),
+    ('zes', 'z'),
+    ('ns', 'm'),
+    ('s', ''),
+)
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_ISBN_RE = re.compile(r'\d{9}[\dx]|\d{13}')
+
+
+def _fold(text):
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def _stem(token):
+    if len(token) <= 3 or token.isdigit():
+        return token
+
+    for suffix, replacement in _STEM_RULES:
+        if token.endswith(suffix):
+            stemmed = token[:-len(suffix)] + replacement
+            return stemmed if len(stemmed) >= 3 else token
+
+    return token
+
+
+def _compact_isbn(text):
+    if not text:
+        return None
+
+    compact = re.sub(r'[\s-]', '', str(text)).lower()
+    return compact if _ISBN_RE.fullmatch(compact) else None
+
+
+def _stems(text):
+    return [_stem(token)[:TERM_MAX_LENGTH] for token in _TOKEN_RE.findall(_fold(text))] if text else []
+
+
+def document_terms(title, volume=None, isbn=None, authors=(), author_observations=(),
+                   collection=None, translators=()):
+    terms = {}
+
+    def add(text, weight):
+        for term in set(_stems(text)):
+            terms[term] = terms.get(term, 0) + weight
+
+    add(title, WEIGHT_TITLE)
+    add(volume, WEIGHT_TITLE)
+    add(collection, WEIGHT_COLLECTION)
+
+    for author in authors:
+        add(author, WEIGHT_AUTHOR)
+
+    for observation in author_observations:
+        add(observation, WEIGHT_OBSERVATION)
+
+    for translator in translators:
+        add(translator, WEIGHT_TRANSLATOR)
+
+    isbn = _compact_isbn(isbn)
+    if isbn:
+        terms[isbn] = terms.get(isbn, 0) + WEIGHT_ISBN
+
+    return terms
+
+
+def build_search_index(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BookSearchTerm = apps.get_model('books', 'BookSearchTerm')
+
+    book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+
+    for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+        books = Book.objects.filter(pk__in=book_ids[start:start + INDEX_BATCH_SIZE]).select_related(
+            'collection').prefetch_related('authors', 'translators')
+
+        terms = []
+        for book in books:
+            authors = list(book.authors.all())
+            document = document_terms(
+                title=book.title,
+                volume=book.volume,
+                isbn=book.isbn,
+                authors=[author.name for author in authors],
+                author_observations=[author.observation for author in authors if author.observation],
+                collection=book.collection.name if book.collection else None,
+                translators=[translator.name for translator in book.translators.all()],
+            )
+            terms.extend(BookSearchTerm(book_id=book.pk, term=term, weight=weight)
+                         for term, weight in document.items())
+
+        BookSearchTerm.objects.bulk_create(terms, batch_size=INDEX_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_alter_borrow_date_borrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64, verbose_name='Term')),
+                ('weight', models.PositiveSmallIntegerField(default=1, verbose_name='Weight')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='books.book', verbose_name='Book')),
+            ],
+            options={
+                'verbose_name': 'Search term',
+                'verbose_name_plural': 'Search terms',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='booksearchterm',
+            constraint=models.UniqueConstraint(fields=('book', 'term'), name='unique_book_search_term'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def fill_current_borrow(apps, schema_editor):
+    Borrow = apps.get_model('books', 'Borrow')
+    PhysicalBook = apps.get_model('books', 'PhysicalBook')
+
+    open_borrow = Borrow.objects.filter(book=OuterRef('pk'), date_return__isnull=True).order_by(
+        '-date_borrow', '-pk').values('pk')[:1]
+    PhysicalBook.objects.update(current_borrow=Subquery(open_borrow))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_search_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='physicalbook',
+            name='current_borrow',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='books.borrow', verbose_name='Current borrow'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalbook',
+            index=models.Index(fields=['book', 'status', 'current_borrow'], name='physicalbook_availability_idx'),
+        ),
+        migrations.RunPython(fill_current_borrow, migrations.RunPython.noop),
+    ]
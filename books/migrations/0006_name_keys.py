@@ -0,0 +1,205 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copied from `books.text` and `books.search` as they were, so this migration merges the same
+# names and builds the same index however they change later
+INDEX_BATCH_SIZE = 500
+TERM_MAX_LENGTH = 64
+
+WEIGHT_ISBN = 16
+WEIGHT_TITLE = 8
+WEIGHT_AUTHOR = 4
+WEIGHT_COLLECTION = 2
+WEIGHT_TRANSLATOR = 1
+WEIGHT_OBSERVATION = 1
+
+_STEM_RULES = (
+    ('mente', ''),
+    ('oes', 'ao'),
+    ('aes', 'ao'),
+    ('ais', 'al'),
+    ('eis', 'el'),
+    ('ois', 'ol'),
+    ('res', 'r'),
+    ('zes', 'z'),
+    ('ns', 'm'),
+    ('s', ''),
+)
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_ISBN_RE = re.compile(r'\d{9}[\dx]|\d{13}')
+
+
+def _fold(text):
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def normalize_name(name):
+    return ' '.join(_fold(name).split())
+
+
+def _stem(token):
+    if len(token) <= 3 or token.isdigit():
+        return token
+
+    for suffix, replacement in _STEM_RULES:
+        if token.endswith(suffix):
+            stemmed = token[:-len(suffix)] + replacement
+            return stemmed if len(stemmed) >= 3 else token
+
+    return token
+
+
+def _compact_isbn(text):
+    if not text:
+        return None
+
+    compact = re.sub(r'[\s-]', '', str(text)).lower()
+    return compact if _ISBN_RE.fullmatch(compact) else None
+
+
+def _stems(text):
+    return [_stem(token)[:TERM_MAX_LENGTH] for token in _TOKEN_RE.findall(_fold(text))] if text else []
+
+
+def document_terms(title, volume=None, isbn=None, authors=(), author_observations=(),
+                   collection=None, translators=()):
+    terms = {}
+
+    def add(text, weight):
+        for term in set(_stems(text)):
+            terms[term] = terms.get(term, 0) + weight
+
+    add(title, WEIGHT_TITLE)
+    add(volume, WEIGHT_TITLE)
+    add(collection, WEIGHT_COLLECTION)
+
+    for author in authors:
+        add(author, WEIGHT_AUTHOR)
+
+    for observation in author_observations:
+        add(observation, WEIGHT_OBSERVATION)
+
+    for translator in translators:
+        add(translator, WEIGHT_TRANSLATOR)
+
+    isbn = _compact_isbn(isbn)
+    if isbn:
+        terms[isbn] = terms.get(isbn, 0) + WEIGHT_ISBN
+
+    return terms
+
+
+def book_terms(book):
+    authors = list(book.authors.all())
+
+    return document_terms(
+        title=book.title,
+        volume=book.volume,
+        isbn=book.isbn,
+        authors=[author.name for author in authors],
+        author_observations=[author.observation for author in authors if author.observation],
+        collection=book.collection.name if book.collection else None,
+        translators=[translator.name for translator in book.translators.all()],
+    )
+
+
+NAMED_MODELS = ('publisher', 'translator', 'collection', 'author')
+AUTHOR_DETAILS = ('year_of_birth', 'year_of_death', 'pha', 'pha_label', 'observation')
+
+
+def _merge_foreign_keys(Book, field, canonical_pk, duplicate_pks):
+    Book.objects.filter(**{f'{field}__in': duplicate_pks}).update(**{field: canonical_pk})
+
+
+def _merge_many_to_many(Book, field, canonical_pk, duplicate_pks):
+    through = getattr(Book, field).through
+    column = through._meta.get_field(field[:-1]).attname
+
+    linked = set(through.objects.filter(**{column: canonical_pk}).values_list('book_id', flat=True))
+    for row in through.objects.filter(**{f'{column}__in': duplicate_pks}).order_by('pk'):
+        if row.book_id in linked:
+            row.delete()
+        else:
+            linked.add(row.book_id)
+            setattr(row, column, canonical_pk)
+            row.save(update_fields=[column])
+
+
+def _reindex_books(apps, book_ids):
+    """Search terms of the books whose authors, translators or collection were merged, as built anew."""
+    Book = apps.get_model('books', 'Book')
+    BookSearchTerm = apps.get_model('books', 'BookSearchTerm')
+
+    book_ids = sorted(book_ids)
+    for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+        batch = book_ids[start:start + INDEX_BATCH_SIZE]
+        books = Book.objects.filter(pk__in=batch).select_related('collection').prefetch_related('authors', 'translators')
+
+        BookSearchTerm.objects.filter(book_id__in=batch).delete()
+        BookSearchTerm.objects.bulk_create((
+            BookSearchTerm(book_id=book.pk, term=term, weight=weight)
+            for book in books for term, weight in book_terms(book).items()
+        ), batch_size=INDEX_BATCH_SIZE)
+
+
+def fill_name_keys(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    # Merged authors and translators weighed their names twice on books linked to several of them,
+    # and author observations filled from duplicates are indexed terms
+    merged_book_ids = set()
+
+    for model_name in NAMED_MODELS:
+        model = apps.get_model('books', model_name)
+
+        groups = {}
+        for obj in model.objects.order_by('pk'):
+            obj.name_key = normalize_name(obj.name)
+            groups.setdefault(obj.name_key, []).append(obj)
+
+        for objs in groups.values():
+            # The oldest row is kept, the others are merged into it
+            canonical, duplicates = objs[0], objs[1:]
+            duplicate_pks = [obj.pk for obj in duplicates]
+
+            if duplicates:
+                if model_name in ('publisher', 'collection'):
+                    _merge_foreign_keys(Book, model_name, canonical.pk, duplicate_pks)
+                else:
+                    _merge_many_to_many(Book, f'{model_name}s', canonical.pk, duplicate_pks)
+
+                if model_name == 'author':
+                    for field in AUTHOR_DETAILS:
+                        if getattr(canonical, field) in (None, ''):
+                            setattr(canonical, field, next(
+                                (getattr(obj, field) for obj in duplicates if getattr(obj, field) not in (None, '')),
+                                getattr(canonical, field)))
+
+                model.objects.filter(pk__in=duplicate_pks).delete()
+
+                if model_name != 'publisher':
+                    lookup = f'{model_name}s' if model_name in ('author', 'translator') else model_name
+                    merged_book_ids.update(Book.objects.filter(**{lookup: canonical.pk}).values_list('pk', flat=True))
+
+            canonical.save()
+
+    _reindex_books(apps, merged_book_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_physicalbook_current_borrow'),
+    ]
+
+    operations = [
+        *(migrations.AddField(
+            model_name=model_name,
+            name='name_key',
+            field=models.CharField(editable=False, max_length=256, null=True, verbose_name='Name key'),
+        ) for model_name in NAMED_MODELS),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+NAMED_MODELS = ('publisher', 'translator', 'collection', 'author')
+
+
+class Migration(migrations.Migration):
+    # Separate from 0006, PostgreSQL cannot alter tables with pending constraint checks from the merge
+
+    dependencies = [
+        ('books', '0006_name_keys'),
+    ]
+
+    operations = [
+        *(migrations.AlterField(
+            model_name=model_name,
+            name='name_key',
+            field=models.CharField(editable=False, max_length=256, unique=True, verbose_name='Name key'),
+        ) for model_name in NAMED_MODELS),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:37
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def start_physical_id_sequence(apps, schema_editor):
+    PhysicalBook = apps.get_model('books', 'PhysicalBook')
+    Sequence = apps.get_model('books', 'Sequence')
+
+    last_value = PhysicalBook.objects.aggregate(Max('physical_id'))['physical_id__max'] or 0
+    Sequence.objects.create(name='physical_book', last_value=last_value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_unique_name_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Name')),
+                ('last_value', models.PositiveBigIntegerField(default=0, verbose_name='Last value')),
+            ],
+            options={
+                'verbose_name': 'Sequence',
+                'verbose_name_plural': 'Sequences',
+            },
+        ),
+        migrations.AlterField(
+            model_name='physicalbook',
+            name='physical_id',
+            field=models.PositiveIntegerField(blank=True, help_text='Leave blank to use the next free ID', unique=True, verbose_name='Physical ID'),
+        ),
+        migrations.RunPython(start_physical_id_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_open_borrows(apps, schema_editor):
+    Borrow = apps.get_model('books', 'Borrow')
+
+    duplicated = list(Borrow.objects.filter(date_return__isnull=True).values('book_id').annotate(
+        open_borrows=Count('pk')).filter(open_borrows__gt=1).values_list('book_id', flat=True))
+    if duplicated:
+        raise RuntimeError('Physical books lent more than once at the same time, set the return date of '
+                           f'their older borrows before migrating: {duplicated}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_physical_id_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_open_borrows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['book', 'date_return'], name='borrow_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['reader', 'date_return'], name='borrow_reader_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['date_borrow'], name='borrow_date_borrow_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='borrow',
+            constraint=models.UniqueConstraint(condition=models.Q(('date_return__isnull', True)), fields=('book',), name='unique_open_borrow_per_book'),
+        ),
+    ]
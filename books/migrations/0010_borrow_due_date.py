@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:39
+
+from django.db import migrations, models
+import django.db.models.expressions
+from datetime import timedelta
+
+
+def fill_due_dates(apps, schema_editor):
+    Borrow = apps.get_model('books', 'Borrow')
+
+    # Loans made so far were for one week, whatever LOAN_PERIOD_DAYS is now
+    borrows = []
+    for borrow in Borrow.objects.only('date_borrow', 'renew_count').iterator():
+        borrow.due_date = borrow.date_borrow + timedelta(weeks=1 + borrow.renew_count)
+        borrows.append(borrow)
+
+        if len(borrows) == 1000:
+            Borrow.objects.bulk_update(borrows, ['due_date'])
+            borrows = []
+
+    Borrow.objects.bulk_update(borrows, ['due_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_open_borrow_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrow',
+            name='due_date',
+            field=models.DateField(editable=False, null=True, verbose_name='Due date'),
+        ),
+        migrations.RunPython(fill_due_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='borrow',
+            name='due_date',
+            field=models.DateField(editable=False, verbose_name='Due date'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('date_return__isnull', True)), fields=['due_date'], name='borrow_open_due_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('date_return__gt', django.db.models.expressions.F('due_date'))), fields=['date_return'], name='borrow_returned_late_idx'),
+        ),
+    ]
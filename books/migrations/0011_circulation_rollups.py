@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_rollups(apps, schema_editor):
+    # Same as `circulation.rebuild`, on the historical models
+    Borrow = apps.get_model('books', 'Borrow')
+    PhysicalBook = apps.get_model('books', 'PhysicalBook')
+    DailyCirculation = apps.get_model('books', 'DailyCirculation')
+    StatusCount = apps.get_model('books', 'StatusCount')
+
+    circulation = {}
+    for field, date_field in (('borrows', 'date_borrow'), ('returns', 'date_return')):
+        for day, shelf_id, count in Borrow.objects.filter(**{f'{date_field}__isnull': False}).order_by().values_list(
+                date_field, 'book__shelf').annotate(Count('pk')):
+            row = circulation.setdefault((day, shelf_id), DailyCirculation(date=day, shelf_id=shelf_id))
+            setattr(row, field, count)
+    DailyCirculation.objects.bulk_create(circulation.values(), batch_size=1000)
+
+    StatusCount.objects.bulk_create(StatusCount(status=status, copies=count) for status, count in
+                                    PhysicalBook.objects.order_by().values_list('status').annotate(Count('pk')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_borrow_due_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('circulant', 'Circulant'), ('archived', 'Archived'), ('lost_by_user', 'Downed / Lost by user'), ('defective', 'Downed / Defective book'), ('not_circulant', 'Not circulant')], max_length=255, unique=True, verbose_name='Status')),
+                ('copies', models.IntegerField(default=0, verbose_name='Copies')),
+            ],
+            options={
+                'verbose_name': 'Status count',
+                'verbose_name_plural': 'Status counts',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCirculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('borrows', models.IntegerField(default=0, verbose_name='Borrows')),
+                ('returns', models.IntegerField(default=0, verbose_name='Returns')),
+                ('shelf', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='books.shelf', verbose_name='Subject')),
+            ],
+            options={
+                'verbose_name': 'Daily circulation',
+                'verbose_name_plural': 'Daily circulation',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailycirculation',
+            constraint=models.UniqueConstraint(fields=('date', 'shelf'), name='unique_daily_circulation'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycirculation',
+            constraint=models.UniqueConstraint(condition=models.Q(('shelf__isnull', True)), fields=('date',), name='unique_daily_circulation_no_shelf'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:54
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Copied from `books.subjects` as it was, so this migration fills the same keys however it changes later
+KEY_LENGTH = 12
+
+_DDC_RE = re.compile(r'\s*(\d{3})(?:\.(\d+))?')
+
+
+def ddc_key(ddc):
+    match = _DDC_RE.match(ddc or '')
+    if not match:
+        return None
+    return (match.group(1) + (match.group(2) or ''))[:KEY_LENGTH]
+
+
+def ancestors(key):
+    return [key[:length] for length in range(1, len(key) + 1)] if key else []
+
+
+def fill_subjects(apps, schema_editor):
+    # Same as `subjects.rebuild`, on the historical models
+    PhysicalBook = apps.get_model('books', 'PhysicalBook')
+    Shelf = apps.get_model('books', 'Shelf')
+    SubjectNode = apps.get_model('books', 'SubjectNode')
+
+    shelves = list(Shelf.objects.only('pk', 'ddc'))
+    for shelf in shelves:
+        shelf.subject_key = ddc_key(shelf.ddc)
+    Shelf.objects.bulk_update(shelves, ['subject_key'], batch_size=1000)
+
+    copies = Counter()
+    for key, count in PhysicalBook.objects.filter(shelf__subject_key__isnull=False).order_by().values_list(
+            'shelf__subject_key').annotate(Count('pk')):
+        for node in ancestors(key):
+            copies[node] += count
+
+    book_nodes = {}
+    for book_id, key in PhysicalBook.objects.filter(shelf__subject_key__isnull=False).order_by().values_list(
+            'book', 'shelf__subject_key').distinct().iterator():
+        book_nodes.setdefault(book_id, set()).update(ancestors(key))
+    titles = Counter()
+    for nodes in book_nodes.values():
+        titles.update(nodes)
+
+    SubjectNode.objects.bulk_create((
+        SubjectNode(key=key, depth=len(key), copies=copies[key], titles=titles[key])
+        for key in sorted(copies)
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubjectNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=12, unique=True, verbose_name='Key')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='Depth')),
+                ('copies', models.IntegerField(default=0, verbose_name='Copies')),
+                ('titles', models.IntegerField(default=0, verbose_name='Titles')),
+            ],
+            options={
+                'verbose_name': 'Subject node',
+                'verbose_name_plural': 'Subject nodes',
+            },
+        ),
+        migrations.AddField(
+            model_name='shelf',
+            name='subject_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True, verbose_name='Subject key'),
+        ),
+        migrations.RunPython(fill_subjects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copied from `books.text` as it was, so this migration fills the same keys however it changes later
+def normalize_name(name):
+    text = unicodedata.normalize('NFKD', str(name).casefold())
+    return ' '.join(''.join(char for char in text if not unicodedata.combining(char)).split())
+
+
+def fill_name_keys(apps, schema_editor):
+    Reader = apps.get_model('books', 'Reader')
+
+    readers = list(Reader.objects.only('pk', 'name'))
+    for reader in readers:
+        reader.name_key = normalize_name(reader.name)
+    Reader.objects.bulk_update(readers, ['name_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_subject_nodes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reader',
+            name='name_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='Name key'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='reader',
+            name='document',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True, verbose_name='Document'),
+        ),
+    ]
@@ -1,21 +1,144 @@
 from datetime import timedelta
+from functools import partial
 
+from django.conf import settings
 from django.contrib import admin
-from django.db import models
-from django.db.models import Max, Q, QuerySet
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet
 from django.forms import ValidationError
+from django.utils import timezone
 from django.utils.timezone import datetime
 from django.utils.translation import ugettext_lazy as _
 from isbn_field import ISBNField
 
+from .text import normalize_name
+
 
 def _bound_text(text, limit=100):
     return text if len(text) < limit else text[:limit] + '...'
 
 
-class Publisher(models.Model):
+class LoadedStateMixin:
+    """
+    Keeps the TRACKED_FIELDS of a row as last read or written, so saves and their signals can tell
+    what changed without reading the row again.
+    """
+    TRACKED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = {field: getattr(instance, field) for field in cls.TRACKED_FIELDS if field in instance.__dict__}
+        return instance
+
+    def changed(self, field) -> bool:
+        """Whether `field` differs from the row as loaded. True for new rows and fields not loaded."""
+        loaded = getattr(self, '_loaded', {})
+        return self._state.adding or field not in loaded or loaded[field] != getattr(self, field)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        self._loaded = {
+            **getattr(self, '_loaded', {}),
+            **{field: getattr(self, field) for field in self.TRACKED_FIELDS
+               if update_fields is None or field in update_fields or self._meta.get_field(field).name in update_fields},
+        }
+
+
+class Sequence(models.Model):
+    """Named counter handing out numbers that are never handed out again."""
+    name = models.CharField(max_length=64, primary_key=True, verbose_name=_('Name'))
+    last_value = models.PositiveBigIntegerField(default=0, verbose_name=_('Last value'))
+
+    class Meta:
+        verbose_name = _('Sequence')
+        verbose_name_plural = _('Sequences')
+
+    def __str__(self):
+        return f'{self.name}: {self.last_value}'
+
+    @staticmethod
+    def allocate(name, count=1) -> range:
+        """
+        Reserves `count` consecutive numbers of the sequence `name`.
+        The counter row stays locked until the current transaction ends, so callers should keep it short.
+        """
+        with transaction.atomic():
+            counter = Sequence.objects.filter(name=name)
+            if not counter.update(last_value=F('last_value') + count):
+                Sequence.objects.get_or_create(name=name)
+                counter.update(last_value=F('last_value') + count)
+            last_value = counter.values_list('last_value', flat=True).get()
+
+        return range(last_value - count + 1, last_value + 1)
+
+    @staticmethod
+    def advance(name, value):
+        """Makes sure `value`, taken by hand, is never allocated. Only locks the counter when it moves."""
+        if not Sequence.objects.filter(name=name, last_value__lt=value).update(last_value=value):
+            Sequence.objects.get_or_create(name=name, defaults={'last_value': value})
+
+
+class NameQuerySet(QuerySet):
+    def bulk_get_or_create(self, names) -> list:
+        """
+        Rows named as `names`, in the same order, creating the missing ones in a single transaction.
+        Names are matched by their normalized key, through its unique index.
+        """
+        keys = [normalize_name(name) for name in names]
+
+        found = {obj.name_key: obj for obj in self.filter(name_key__in=set(keys))}
+
+        missing = {}
+        for key, name in zip(keys, names):
+            if key not in found and key not in missing:
+                missing[key] = self.model(name=name.strip(), name_key=key)
+
+        if missing:
+            from .autocomplete import invalidate
+
+            with transaction.atomic():
+                # Rows created concurrently by someone else are skipped, then read back as ours
+                self.bulk_create(missing.values(), ignore_conflicts=True)
+                transaction.on_commit(partial(invalidate, self.model))
+            found.update((obj.name_key, obj) for obj in self.filter(name_key__in=list(missing)))
+
+        return [found[key] for key in keys]
+
+
+class NamedModel(models.Model):
     name = models.CharField(max_length=256, verbose_name=_('Name'))
+    # Normalized name, see `normalize_name`
+    name_key = models.CharField(max_length=256, unique=True, editable=False, verbose_name=_('Name key'))
+
+    objects = NameQuerySet.as_manager()
 
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        super().clean()
+
+        self.name_key = normalize_name(self.name)
+        if type(self).objects.filter(name_key=self.name_key).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': _('%(model)s with this name already exists') % {
+                'model': self._meta.verbose_name}})
+
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def find_by_name_exact(cls, name) -> QuerySet:
+        return cls.objects.filter(name_key=normalize_name(name))
+
+
+class Publisher(NamedModel):
     class Meta:
         verbose_name = _('Publisher')
         verbose_name_plural = _('Publishers')
@@ -23,16 +146,16 @@ class Meta:
     def __str__(self):
         return _bound_text(self.name)
 
-    @staticmethod
-    def find_by_name_exact(publisher_name) -> QuerySet:
-        return Publisher.objects.filter(name__iexact=publisher_name)
-
 
 class Shelf(models.Model):
     ddc = models.CharField(blank=True, null=True,
                            max_length=10, verbose_name=_('DDC'))
     description = models.CharField(
         max_length=1024, verbose_name=_('Description'))
+    # Digits of the DDC code, the key of its `SubjectNode`
+    subject_key = models.CharField(
+        max_length=12, blank=True, null=True, editable=False, db_index=True, verbose_name=_('Subject key'))
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name=_('Updated at'))
 
     class Meta:
         verbose_name = _('Subject')
@@ -41,44 +164,31 @@ class Meta:
     def __str__(self):
         return _bound_text(f"{self.ddc + ' - ' if self.ddc else ''} {self.description}")
 
+    def save(self, *args, **kwargs):
+        from .subjects import ddc_key
+        self.subject_key = ddc_key(self.ddc)
+        super().save(*args, **kwargs)
+
     @staticmethod
     def find_equals(other) -> QuerySet:
         return Shelf.objects.filter(ddc=other.ddc, description=other.description)
 
 
-class Translator(models.Model):
-    name = models.CharField(max_length=256, verbose_name=_('Name'))
-
+class Translator(NamedModel):
     class Meta:
         verbose_name = _('Translator')
         verbose_name_plural = _('Translators')
 
-    def __str__(self):
-        return self.name
-
-    @staticmethod
-    def find_by_name_exact(translator_name) -> QuerySet:
-        return Translator.objects.filter(Q(name__iexact=translator_name))
-
 
-class Collection(models.Model):
-    name = models.CharField(max_length=256, verbose_name=_('Name'))
+class Collection(NamedModel):
     # publisher = models.ForeignKey(Publisher, on_delete=models.PROTECT, verbose_name=_('Publisher'))
 
     class Meta:
         verbose_name = _('Collection')
         verbose_name_plural = _('Collections')
 
-    def __str__(self):
-        return self.name
-
-    @staticmethod
-    def find_by_name_exact(collection_name) -> QuerySet:
-        return Collection.objects.filter(name__iexact=collection_name)
-
 
-class Author(models.Model):
-    name = models.CharField(max_length=256, verbose_name=_('Name'))
+class Author(NamedModel):
     year_of_birth = models.CharField(
         max_length=10, blank=True, null=True, verbose_name=_('Year of birth'))
     year_of_death = models.CharField(
@@ -89,14 +199,12 @@ class Author(models.Model):
         max_length=10, blank=True, null=True, verbose_name=_('PHA Label'))
     observation = models.TextField(
         blank=True, null=True, verbose_name=_('Observation'))
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name=_('Updated at'))
 
     class Meta:
         verbose_name = _('Author')
         verbose_name_plural = _('Authors')
 
-    def __str__(self):
-        return self.name
-
     @staticmethod
     def find_equals(other) -> QuerySet:
         return Author.objects.filter(
@@ -108,10 +216,6 @@ def find_equals(other) -> QuerySet:
             Q(observation=other.observation),
         )
 
-    @staticmethod
-    def find_by_name_exact(author_name) -> QuerySet:
-        return Author.objects.filter(Q(name__iexact=author_name))
-
 
 class BookStatus(models.TextChoices):
     circulant = 'circulant', _('Circulant')
@@ -121,6 +225,20 @@ class BookStatus(models.TextChoices):
     not_circulant = 'not_circulant', _('Not circulant')
 
 
+class BookQuerySet(QuerySet):
+    def with_listing_data(self) -> QuerySet:
+        """Loads everything `title_str`, `authors_str`, `infos` and `available` need in a fixed number of queries."""
+        return self.select_related('publisher', 'collection').prefetch_related('authors', 'translators').annotate(
+            available=Exists(PhysicalBook.objects.available().filter(book=OuterRef('pk'))))
+
+    def touch(self) -> int:
+        """Marks the books as modified, for changes `save` does not see (relations, bulk writes)."""
+        from .search_cache import invalidate_filters
+
+        transaction.on_commit(invalidate_filters)
+        return self.update(updated_at=timezone.now())
+
+
 class Book(models.Model):
     isbn = ISBNField(blank=True, null=True, verbose_name=_('ISBN'))
     title = models.CharField(max_length=1024, verbose_name=_('Title'))
@@ -142,6 +260,10 @@ class Book(models.Model):
         max_length=50, blank=True, null=True, verbose_name=_('Page count'))
     pha = models.CharField(max_length=50, blank=True,
                            null=True, verbose_name=_('PHA'))
+    # Also moved by changes to the authors and translators, see `signals`
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name=_('Updated at'))
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('Book')
@@ -180,10 +302,10 @@ def infos(self):
         if self.collection:
             infos.append(f"{_('Collection')}: {self.collection}")
 
-        translators_count = self.translators.count()
-        if translators_count > 0:
+        translators = self.translators.all()
+        if translators:
             translator_prefix = _(
-                'Translator' if translators_count == 1 else 'Translators')
+                'Translator' if len(translators) == 1 else 'Translators')
             infos.append(f"{translator_prefix}: {self.translators_str()}")
 
         return infos
@@ -192,14 +314,10 @@ def __str__(self):
         return self.title_str()
 
     @staticmethod
-    def search_by_text(search_text) -> QuerySet:
-        return Book.objects.filter(
-            Q(isbn__iexact=search_text) |
-            Q(title__icontains=search_text) |
-            Q(authors__name__icontains=search_text) |
-            Q(authors__observation__icontains=search_text) |
-            Q(collection__name__icontains=search_text)
-        ).distinct()
+    def search_by_text(search_text, filters=None) -> QuerySet:
+        from .facets import filter_books
+        from .search import search_books
+        return search_books(search_text, filter_books(Book.objects.all(), filters or {})).with_listing_data()
 
     @staticmethod
     def find_equals(other, authors, translators) -> QuerySet:
@@ -211,11 +329,9 @@ def find_equals(other, authors, translators) -> QuerySet:
         query.add(Q(local=other.local), Q.AND)
         query.add(Q(publisher=other.publisher), Q.AND)
         query.add(Q(year=other.year), Q.AND)
-        query.add(Q(page_count=other.page_countitle_strt), Q.AND)
+        query.add(Q(page_count=other.page_count), Q.AND)
         query.add(Q(isbn=other.isbn), Q.AND)
         query.add(Q(pha=other.pha), Q.AND)
-        query.add(Q(shelf=other.shelf), Q.AND)
-        query.add(Q(observations=other.observations), Q.AND)
 
         if authors:
             query.add(
@@ -228,9 +344,37 @@ def find_equals(other, authors, translators) -> QuerySet:
         return Book.objects.filter(query)
 
 
-class PhysicalBook(models.Model):
+class BookSearchTerm(models.Model):
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name='search_terms', verbose_name=_('Book'))
+    term = models.CharField(max_length=64, db_index=True, verbose_name=_('Term'))
+    weight = models.PositiveSmallIntegerField(default=1, verbose_name=_('Weight'))
+
+    class Meta:
+        verbose_name = _('Search term')
+        verbose_name_plural = _('Search terms')
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'term'], name='unique_book_search_term'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class PhysicalBookQuerySet(QuerySet):
+    def available(self) -> QuerySet:
+        return self.filter(status=BookStatus.circulant, current_borrow__isnull=True)
+
+    def unavailable(self) -> QuerySet:
+        return self.exclude(status=BookStatus.circulant, current_borrow__isnull=True)
+
+
+class PhysicalBook(LoadedStateMixin, models.Model):
+    # Sequence the physical IDs are allocated from
+    ID_SEQUENCE = 'physical_book'
+
     physical_id = models.PositiveIntegerField(
-        unique=True, verbose_name=_('Physical ID'))
+        unique=True, blank=True, verbose_name=_('Physical ID'), help_text=_('Leave blank to use the next free ID'))
     book = models.ForeignKey(
         Book, on_delete=models.PROTECT, null=False, verbose_name=_('Book'))
     shelf = models.ForeignKey(
@@ -239,10 +383,27 @@ class PhysicalBook(models.Model):
         max_length=2048, blank=True, null=True, verbose_name=_('Observations'))
     status = models.CharField(max_length=255, choices=BookStatus.choices, verbose_name=_(
         'Status'), default=BookStatus.circulant)
+    # Open loan of this copy, maintained by `Borrow.save`
+    current_borrow = models.OneToOneField(
+        'Borrow', on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='+',
+        verbose_name=_('Current borrow'))
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name=_('Updated at'))
+
+    objects = PhysicalBookQuerySet.as_manager()
+
+    # What the status, subject and circulation rollups depend on
+    TRACKED_FIELDS = ('status', 'book_id', 'shelf_id')
 
     class Meta:
         verbose_name = _('Physical Book')
         verbose_name_plural = _('Physical Books')
+        indexes = [
+            models.Index(fields=['book', 'status', 'current_borrow'], name='physicalbook_availability_idx'),
+        ]
+
+    @property
+    def is_available(self):
+        return self.status == BookStatus.circulant and self.current_borrow_id is None
 
     @admin.display(description=_('Title'))
     def book_title_str(self):
@@ -263,7 +424,7 @@ def book_collection_str(self):
     @staticmethod
     def find_equals(other) -> QuerySet:
         return PhysicalBook.objects.filter(
-            physical_id=other.dv,
+            physical_id=other.physical_id,
             book=other.book,
             shelf=other.shelf,
             observations=other.observations,
@@ -271,10 +432,17 @@ def find_equals(other) -> QuerySet:
         )
 
     @staticmethod
-    def next_physical_id():
-        max_id = PhysicalBook.objects.aggregate(Max('physical_id'))[
-            'physical_id__max']
-        return max_id + 1 if max_id else 1
+    def allocate_physical_ids(count) -> range:
+        """Reserves `count` consecutive physical IDs, for copies created in bulk or labels printed ahead."""
+        return Sequence.allocate(PhysicalBook.ID_SEQUENCE, count)
+
+    def save(self, *args, **kwargs):
+        if self.physical_id is None:
+            self.physical_id = self.allocate_physical_ids(1)[0]
+        else:
+            Sequence.advance(self.ID_SEQUENCE, self.physical_id)
+
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return "{physical_id} | {title} | {authors}".format(physical_id=self.physical_id, title=self.book_title_str(), authors=self.book_authors_str())
@@ -282,7 +450,9 @@ def __str__(self):
 
 class Reader(models.Model):
     name = models.CharField(max_length=255, verbose_name=_('Name'))
-    document = models.CharField(max_length=255, blank=True, null=True, verbose_name=_('Document'))
+    # Normalized name, see `normalize_name`, for prefix searches
+    name_key = models.CharField(max_length=255, editable=False, db_index=True, verbose_name=_('Name key'))
+    document = models.CharField(max_length=255, blank=True, null=True, db_index=True, verbose_name=_('Document'))
     contact = models.CharField(max_length=255, blank=True, null=True, verbose_name=_('Contact'))
     birthday = models.DateField(
         blank=True, null=True, verbose_name=_('Birthday'))
@@ -295,8 +465,27 @@ class Meta:
     def __str__(self) -> str:
         return '{} | {}'.format(self.id, self.name)
 
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+
+class BorrowQuerySet(QuerySet):
+    def late(self, today=None) -> QuerySet:
+        """Borrows past their due date, open or returned."""
+        today = today or datetime.today().date()
+        return self.filter(Q(date_return__isnull=True, due_date__lt=today) | Q(date_return__gt=F('due_date')))
+
+    def on_time(self, today=None) -> QuerySet:
+        today = today or datetime.today().date()
+        return self.filter(Q(date_return__isnull=True, due_date__gte=today) | Q(date_return__lte=F('due_date')))
 
-class Borrow(models.Model):
+    def overdue(self, today=None) -> QuerySet:
+        """Open borrows past their due date."""
+        return self.filter(date_return__isnull=True, due_date__lt=today or datetime.today().date())
+
+
+class Borrow(LoadedStateMixin, models.Model):
     book = models.ForeignKey(
         PhysicalBook, on_delete=models.PROTECT, verbose_name=_('Book'))
     reader = models.ForeignKey(
@@ -307,32 +496,66 @@ class Borrow(models.Model):
         'Date return'))
     renew_count = models.PositiveIntegerField(
         verbose_name=_('Renew count'), default=0)
+    # Computed from the fields above by `save`
+    due_date = models.DateField(editable=False, verbose_name=_('Due date'))
     observation = models.TextField(
         blank=True, null=True, verbose_name=_('Observation'))
 
+    objects = BorrowQuerySet.as_manager()
+
+    # What the due date and the circulation rollup depend on
+    TRACKED_FIELDS = ('book_id', 'date_borrow', 'date_return', 'renew_count')
+
     @admin.display(description=_('Status'))
     def status_str(self):
-        date_limit = self.date_borrow + timedelta(weeks=1 + self.renew_count)
+        due_date = self.due_date or self.compute_due_date()
 
         if self.date_return:
-            if self.date_return > date_limit:
+            if self.date_return > due_date:
                 return _('Returned late')
             return _('Returned')
 
-        if datetime.today().date() > date_limit:
+        if datetime.today().date() > due_date:
             return _('Late')
         return _('Borrowed')
 
+    def compute_due_date(self):
+        """Each renewal extends the borrow by another LOAN_PERIOD_DAYS."""
+        date_borrow = self._meta.get_field('date_borrow').to_python(self.date_borrow)
+        return date_borrow + timedelta(days=settings.LOAN_PERIOD_DAYS * (self.renew_count + 1))
+
+    def renew(self):
+        if self.date_return:
+            raise ValidationError(_('Returned borrows cannot be renewed'))
+
+        self.renew_count += 1
+        self.save(update_fields=['renew_count', 'due_date'])
+
     class Meta:
         verbose_name = _('Borrow')
         verbose_name_plural = _('Borrows')
+        constraints = [
+            # A copy is lent to one reader at a time, see `save`
+            models.UniqueConstraint(
+                fields=['book'], condition=Q(date_return__isnull=True), name='unique_open_borrow_per_book'),
+        ]
+        indexes = [
+            models.Index(fields=['book', 'date_return'], name='borrow_book_idx'),
+            models.Index(fields=['reader', 'date_return'], name='borrow_reader_idx'),
+            models.Index(fields=['date_borrow'], name='borrow_date_borrow_idx'),
+            # Late borrows, see `BorrowQuerySet.late`
+            models.Index(fields=['due_date'], condition=Q(date_return__isnull=True), name='borrow_open_due_date_idx'),
+            models.Index(fields=['date_return'], condition=Q(date_return__gt=F('due_date')),
+                         name='borrow_returned_late_idx'),
+        ]
 
     def clean(self) -> None:
         super().clean()
 
         errors = {}
 
-        if self.book_id and Borrow.objects.filter(~Q(id=self.id), book=self.book, date_return__isnull=True).exists():
+        # Early answer for forms, which already loaded the book. The constraint has the final word.
+        if self._meta.get_field('book').is_cached(self) and self.book.current_borrow_id not in (None, self.id):
             errors['book'] = _('This book is already borrowed')
 
         if self.date_return and self.date_return < self.date_borrow:
@@ -342,8 +565,101 @@ def clean(self) -> None:
         if errors:
             raise ValidationError(errors)
 
+    def save(self, *args, **kwargs):
+        self.date_borrow = self._meta.get_field('date_borrow').to_python(self.date_borrow)
+        # Kept as it was lent for, whatever LOAN_PERIOD_DAYS is now, unless the loan itself changes
+        if self.due_date is None or self.changed('date_borrow') or self.changed('renew_count'):
+            self.due_date = self.compute_due_date()
+
+        adding = self._state.adding
+
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+
+                # Release any copy still pointing to this borrow (returned, or lent under another copy).
+                # None can point to a borrow just inserted, so a checkout writes its copy once.
+                if not adding:
+                    released = PhysicalBook.objects.filter(current_borrow=self)
+                    if self.date_return is None:
+                        released = released.exclude(pk=self.book_id)
+                    released.update(current_borrow=None, updated_at=timezone.now())
+
+                if self.date_return is None:
+                    PhysicalBook.objects.filter(pk=self.book_id).update(current_borrow=self, updated_at=timezone.now())
+        except IntegrityError:
+            if self.date_return is None and Borrow.objects.filter(
+                    book_id=self.book_id, date_return__isnull=True).exclude(pk=self.pk).exists():
+                raise ValidationError({'book': _('This book is already borrowed')})
+            raise
+
     def __str__(self) -> str:
         date_borrow = self.date_borrow.strftime('%d/%m/%y')
         date_return = self.date_return.strftime('%d/%m/%y') if self.date_return else '?'
 
         return '{} | {} - {} | {}'.format(self.book.book, date_borrow, date_return, self.status_str())
+
+
+class DailyCirculation(models.Model):
+    """
+    Borrows and returns per day and subject, maintained by `circulation`. Borrows count under the
+    current shelf of their copy: when a copy moves, its past borrows move along.
+    """
+    date = models.DateField(verbose_name=_('Date'))
+    shelf = models.ForeignKey(
+        Shelf, on_delete=models.CASCADE, blank=True, null=True, verbose_name=_('Subject'))
+    borrows = models.IntegerField(default=0, verbose_name=_('Borrows'))
+    returns = models.IntegerField(default=0, verbose_name=_('Returns'))
+
+    class Meta:
+        verbose_name = _('Daily circulation')
+        verbose_name_plural = _('Daily circulation')
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'shelf'], name='unique_daily_circulation'),
+            models.UniqueConstraint(
+                fields=['date'], condition=Q(shelf__isnull=True), name='unique_daily_circulation_no_shelf'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} | {self.shelf}'
+
+
+class SubjectNodeQuerySet(QuerySet):
+    def subtree(self, key) -> QuerySet:
+        """The subject `key` and all its narrower subjects, in one range read of the key index."""
+        from .subjects import key_range
+        return self.filter(**key_range(key)) if key else self.all()
+
+
+class SubjectNode(models.Model):
+    """
+    Subject of the DDC hierarchy, keyed by the digits of its code so that its narrower subjects are
+    the keys it prefixes. Copies and titles shelved anywhere under it are maintained by `subjects`.
+    """
+    key = models.CharField(max_length=12, unique=True, verbose_name=_('Key'))
+    depth = models.PositiveSmallIntegerField(verbose_name=_('Depth'))
+    copies = models.IntegerField(default=0, verbose_name=_('Copies'))
+    titles = models.IntegerField(default=0, verbose_name=_('Titles'))
+
+    objects = SubjectNodeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Subject node')
+        verbose_name_plural = _('Subject nodes')
+
+    def __str__(self):
+        from .subjects import label
+        return label(self.key)
+
+
+class StatusCount(models.Model):
+    """Physical books per status, maintained by `circulation`."""
+    status = models.CharField(max_length=255, choices=BookStatus.choices, unique=True, verbose_name=_('Status'))
+    copies = models.IntegerField(default=0, verbose_name=_('Copies'))
+
+    class Meta:
+        verbose_name = _('Status count')
+        verbose_name_plural = _('Status counts')
+
+    def __str__(self):
+        return f'{self.get_status_display()}: {self.copies}'
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import BadRequest
+from django.db.models import Q, QuerySet
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPage:
+    def __init__(self, items, next_token=None):
+        self.items = items
+        self.next_token = next_token
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+
+def page_size(request) -> int:
+    """Page size asked by the client, bounded by SEARCH_MAX_PAGE_SIZE."""
+    try:
+        size = int(request.GET.get('size', settings.SEARCH_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('Page size must be a number')
+
+    return max(1, min(size, settings.SEARCH_MAX_PAGE_SIZE))
+
+
+def _after(keys, values) -> Q:
+    """Rows strictly after `values` in the order given by `keys`."""
+    condition = Q()
+
+    for i, key in enumerate(keys):
+        field = key.lstrip('-')
+        step = Q(**{f'{field}__lt' if key.startswith('-') else f'{field}__gt': values[i]})
+        for previous, value in zip(keys[:i], values[:i]):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+
+    return condition
+
+
+def keyset_page(queryset: QuerySet, keys, token=None, size=None, salt='books.pagination') -> KeysetPage:
+    """
+    Slices `queryset`, ordered by `keys`, right after the row encoded in `token`.
+
+    Unlike offset pagination, rows inserted meanwhile do not shift the following
+    pages. When the keys are indexed columns, as for the catalog, a deep page is
+    also as cheap as the first. When they are computed, such as the `search_rank`
+    of a search, the token becomes a HAVING filter: every page aggregates and
+    sorts all the matching rows, so its cost grows with the number of matches,
+    whatever its depth. The last key must be unique so the order is total.
+    """
+    size = size or settings.SEARCH_PAGE_SIZE
+    queryset = queryset.order_by(*keys)
+
+    if token:
+        try:
+            values = signing.loads(token, salt=salt)
+        except signing.BadSignature:
+            raise BadRequest('Invalid page token')
+
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise BadRequest('Invalid page token')
+
+        queryset = queryset.filter(_after(keys, values))
+
+    items = list(queryset[:size + 1])
+    next_token = None
+
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_token = signing.dumps([getattr(last, key.lstrip('-')) for key in keys], salt=salt, compress=True)
+
+    return KeysetPage(items, next_token)
+
+
+class CatalogCursorPagination(CursorPagination):
+    """Cursor pagination of the catalog API, by the same `size` parameter as the public search."""
+    ordering = 'pk'
+    page_size_query_param = 'size'
+    max_page_size = 200
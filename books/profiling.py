@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.text import slugify
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAMETER = '_profile'
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+\.folded$')
+
+
+def _frame_name(code, prefixes) -> str:
+    filename = code.co_filename
+    for prefix in prefixes:
+        if prefix in filename:
+            filename = filename.split(prefix, 1)[1]
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """
+    Statistical profiler of one thread: another thread looks at its stack every `interval` seconds.
+    Cheaper than tracing every call, and the result is in the folded format flame graph tools read.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._prefixes = ('site-packages' + os.sep, str(settings.BASE_DIR) + os.sep)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code, self._prefixes))
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RateLimit:
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.lock = threading.Lock()
+        self.started = deque()
+        self.running = False
+
+    def acquire(self) -> bool:
+        """One profile at a time per worker, and at most `per_minute` of them."""
+        with self.lock:
+            now = time.monotonic()
+            while self.started and now - self.started[0] > 60:
+                self.started.popleft()
+
+            if self.running or len(self.started) >= self.per_minute:
+                return False
+
+            self.started.append(now)
+            self.running = True
+            return True
+
+    def release(self):
+        with self.lock:
+            self.running = False
+
+
+def profile_directory() -> Path:
+    return Path(settings.PROFILER_DIR)
+
+
+def list_profiles() -> list:
+    """Saved profiles, newest first."""
+    directory = profile_directory()
+    if not directory.is_dir():
+        return []
+
+    profiles = [path for path in directory.iterdir() if PROFILE_NAME_RE.match(path.name)]
+    return sorted(profiles, key=lambda path: (path.stat().st_mtime, path.name), reverse=True)
+
+
+def find_profile(name):
+    """Path of the profile called `name`, or None. Never resolves outside the profile directory."""
+    if not PROFILE_NAME_RE.match(name):
+        return None
+
+    path = profile_directory() / name
+    return path if path.is_file() else None
+
+
+def save_profile(request, view, wall_time, sampler) -> str:
+    directory = profile_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    name = '{:%Y%m%d-%H%M%S-%f}-{}-{}-{}-{:.0f}ms.folded'.format(
+        datetime.now(), os.getpid(), request.method.lower(), slugify(view)[:60], wall_time * 1000)
+    (directory / name).write_text(sampler.folded(), encoding='utf-8')
+
+    # Rotate, keeping the newest PROFILER_KEEP
+    for path in list_profiles()[settings.PROFILER_KEEP:]:
+        path.unlink(missing_ok=True)
+
+    return name
+
+
+class ProfilerMiddleware:
+    """
+    Profiles the requests of staff users that ask for it, with an `X-Profile: 1` header or a
+    `_profile=1` query parameter, within PROFILER_MAX_PER_MINUTE. The name of the saved profile is
+    returned in the X-Profile response header, see the profiles admin page.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rate_limit = RateLimit(settings.PROFILER_MAX_PER_MINUTE)
+
+    def __call__(self, request):
+        wanted = request.META.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_PARAMETER) == '1'
+        if not wanted or not request.user.is_staff:
+            return self.get_response(request)
+
+        if PROFILE_PARAMETER in request.GET:
+            # Hidden from the views, the admin changelists take unknown parameters for filters
+            request.GET = request.GET.copy()
+            del request.GET[PROFILE_PARAMETER]
+            request.META['QUERY_STRING'] = request.GET.urlencode()
+
+        if not self.rate_limit.acquire():
+            response = self.get_response(request)
+            response['X-Profile'] = 'rate-limited'
+            return response
+
+        try:
+            started = time.perf_counter()
+            with Sampler(threading.get_ident(), settings.PROFILER_INTERVAL_MS / 1000) as sampler:
+                response = self.get_response(request)
+            wall_time = time.perf_counter() - started
+
+            match = request.resolver_match
+            response['X-Profile'] = save_profile(
+                request, match.view_name if match else 'unresolved', wall_time, sampler)
+        finally:
+            self.rate_limit.release()
+
+        return response
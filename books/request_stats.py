@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+# Slowest statements kept per request, and slow requests kept per worker
+SLOW_QUERIES_KEPT = 5
+SLOW_REQUESTS_KEPT = 50
+
+
+class QueryRecorder:
+    """`execute_wrapper` timing every statement of a request."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self) -> Counter:
+        """Statements run more than once, by their SQL with placeholders, as N+1 patterns do."""
+        return Counter({sql: count for sql, count in Counter(sql for sql, _ in self.queries).items() if count > 1})
+
+
+class RequestStats:
+    """Per view totals of this worker process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.slow_requests = deque(maxlen=SLOW_REQUESTS_KEPT)
+            self.started_at = time.time()
+
+    def add(self, view, wall_time, recorder, repeated, size, slow_request=None):
+        with self.lock:
+            stats = self.views.setdefault(view, Counter())
+            stats['requests'] += 1
+            stats['wall_ms'] += wall_time * 1000
+            stats['db_ms'] += recorder.db_time * 1000
+            stats['queries'] += len(recorder.queries)
+            stats['duplicate_queries'] += repeated
+            stats['bytes'] += size or 0
+            stats['max_wall_ms'] = max(stats['max_wall_ms'], wall_time * 1000)
+            stats['max_queries'] = max(stats['max_queries'], len(recorder.queries))
+            if slow_request:
+                stats['slow_requests'] += 1
+                self.slow_requests.append(slow_request)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            views = {}
+            for view, stats in self.views.items():
+                requests = stats['requests']
+                views[view] = {
+                    'requests': requests,
+                    'slow_requests': stats['slow_requests'],
+                    'avg_wall_ms': round(stats['wall_ms'] / requests, 2),
+                    'max_wall_ms': round(stats['max_wall_ms'], 2),
+                    'avg_db_ms': round(stats['db_ms'] / requests, 2),
+                    'avg_queries': round(stats['queries'] / requests, 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_duplicate_queries': round(stats['duplicate_queries'] / requests, 2),
+                    'avg_bytes': round(stats['bytes'] / requests),
+                }
+
+            return {
+                'pid': os.getpid(),
+                'since': self.started_at,
+                'views': dict(sorted(views.items(), key=lambda item: -item[1]['avg_wall_ms'] * item[1]['requests'])),
+                'slow_requests': list(self.slow_requests),
+            }
+
+
+stats = RequestStats()
+
+
+class RequestStatsMiddleware:
+    """
+    Records wall time, database time, query count, repeated statements and response size of each
+    request, per view. Totals are served by `RequestStatsApiView`, and staff users get them in a
+    Server-Timing header. Requests slower than REQUEST_STATS_SLOW_MS are logged with their SQL.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_STATS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_time = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        repeated = sum(recorder.duplicates().values())
+
+        slow_request = None
+        if wall_time * 1000 >= settings.REQUEST_STATS_SLOW_MS:
+            slow_request = self.describe(request, view, wall_time, recorder)
+            logger.warning('Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, slowest: %s', request.method,
+                           request.path, view, wall_time * 1000, len(recorder.queries), recorder.db_time * 1000,
+                           slow_request['slowest_queries'])
+
+        stats.add(view, wall_time, recorder, repeated, size, slow_request)
+
+        if settings.REQUEST_STATS_SERVER_TIMING or self.is_staff(request):
+            response['Server-Timing'] = (
+                f'db;dur={recorder.db_time * 1000:.1f};desc="{len(recorder.queries)} queries", '
+                f'dup;desc="{repeated} repeated queries", '
+                f'total;dur={wall_time * 1000:.1f}')
+
+        return response
+
+    @staticmethod
+    def is_staff(request) -> bool:
+        # Only the user the view already loaded, reading the session and the user just for the header
+        # would add queries to every request
+        user = getattr(request, 'user', None)
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            return False
+        return bool(user and user.is_staff)
+
+    @staticmethod
+    def describe(request, view, wall_time, recorder) -> dict:
+        slowest = sorted(recorder.queries, key=lambda query: -query[1])[:SLOW_QUERIES_KEPT]
+
+        return {
+            'at': time.time(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view,
+            'wall_ms': round(wall_time * 1000, 2),
+            'db_ms': round(recorder.db_time * 1000, 2),
+            'queries': len(recorder.queries),
+            'slowest_queries': [{'sql': sql, 'ms': round(duration * 1000, 2)} for sql, duration in slowest],
+            'repeated_queries': [{'sql': sql, 'count': count}
+                                 for sql, count in recorder.duplicates().most_common(SLOW_QUERIES_KEPT)],
+        }
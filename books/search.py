@@ -0,0 +1,206 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Q, QuerySet, Sum, When
+from django.dispatch import Signal
+
+from .text import tokenize
+
+TERM_MAX_LENGTH = 64
+INDEX_BATCH_SIZE = 500
+SEARCH_ORDERING = ('-search_rank', 'pk')
+
+# Sent with the set of `terms` whose postings changed, once the index is written
+search_index_changed = Signal()
+
+# Relevance of a term according to the field it was found in
+WEIGHT_ISBN = 16
+WEIGHT_TITLE = 8
+WEIGHT_AUTHOR = 4
+WEIGHT_COLLECTION = 2
+WEIGHT_TRANSLATOR = 1
+WEIGHT_OBSERVATION = 1
+
+STOP_WORDS = frozenset((
+    'a', 'o', 'as', 'os', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'no',
+    'na', 'nos', 'nas', 'um', 'uma', 'para', 'por', 'com', 'the', 'of', 'and',
+))
+
+# Light portuguese stemmer: reduces plurals and adverbs to a common form.
+# Rules are applied on accent-free text, longest suffix first.
+_STEM_RULES = (
+    ('mente', ''),
+    ('oes', 'ao'),
+    ('aes', 'ao'),
+    ('ais', 'al'),
+    ('eis', 'el'),
+    ('ois', 'ol'),
+    ('res', 'r'),
+    ('zes', 'z'),
+    ('ns', 'm'),
+    ('s', ''),
+)
+
+_ISBN_RE = re.compile(r'\d{9}[\dx]|\d{13}')
+
+
+def stem(token) -> str:
+    if len(token) <= 3 or token.isdigit():
+        return token
+
+    for suffix, replacement in _STEM_RULES:
+        if token.endswith(suffix):
+            stemmed = token[:-len(suffix)] + replacement
+            return stemmed if len(stemmed) >= 3 else token
+
+    return token
+
+
+def compact_isbn(text):
+    if not text:
+        return None
+
+    compact = re.sub(r'[\s-]', '', str(text)).lower()
+    return compact if _ISBN_RE.fullmatch(compact) else None
+
+
+def _stems(text):
+    return [stem(token)[:TERM_MAX_LENGTH] for token in tokenize(text)]
+
+
+def document_terms(title, volume=None, isbn=None, authors=(), author_observations=(),
+                   collection=None, translators=()) -> dict:
+    """Builds the search document of a book as a mapping of term to weight."""
+    terms = {}
+
+    def add(text, weight):
+        for term in set(_stems(text)):
+            terms[term] = terms.get(term, 0) + weight
+
+    add(title, WEIGHT_TITLE)
+    add(volume, WEIGHT_TITLE)
+    add(collection, WEIGHT_COLLECTION)
+
+    for author in authors:
+        add(author, WEIGHT_AUTHOR)
+
+    for observation in author_observations:
+        add(observation, WEIGHT_OBSERVATION)
+
+    for translator in translators:
+        add(translator, WEIGHT_TRANSLATOR)
+
+    isbn = compact_isbn(isbn)
+    if isbn:
+        terms[isbn] = terms.get(isbn, 0) + WEIGHT_ISBN
+
+    return terms
+
+
+def book_terms(book) -> dict:
+    authors = list(book.authors.all())
+
+    return document_terms(
+        title=book.title,
+        volume=book.volume,
+        isbn=book.isbn,
+        authors=[author.name for author in authors],
+        author_observations=[author.observation for author in authors if author.observation],
+        collection=book.collection.name if book.collection else None,
+        translators=[translator.name for translator in book.translators.all()],
+    )
+
+
+def query_terms(search_text) -> list:
+    isbn = compact_isbn(search_text)
+    if isbn:
+        return [isbn]
+
+    stems = list(dict.fromkeys(_stems(search_text)))
+    relevant = [term for term in stems if term not in STOP_WORDS]
+
+    return relevant or stems
+
+
+def search_books(search_text, queryset=None) -> QuerySet:
+    """
+    Books matching every term of the search text, ordered by relevance.
+
+    Each query term is matched as a prefix of the indexed terms, so the lookup
+    is an index range read over `BookSearchTerm.term`.
+    """
+    from .models import Book
+
+    queryset = Book.objects.all() if queryset is None else queryset
+    terms = query_terms(search_text)
+
+    if not terms:
+        return queryset.none()
+
+    if compact_isbn(search_text):
+        conditions = [Q(search_terms__term=terms[0])]
+    else:
+        conditions = [Q(search_terms__term__startswith=term) for term in terms]
+
+    queryset = queryset.filter(reduce(or_, conditions)).annotate(
+        search_rank=Sum('search_terms__weight'))
+
+    if len(conditions) > 1:
+        # Every term must match at least one indexed term of the book
+        matches = {
+            f'search_match_{i}': Max(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+            for i, condition in enumerate(conditions)
+        }
+        queryset = queryset.annotate(**matches).filter(**{name: 1 for name in matches})
+
+    return queryset.order_by(*SEARCH_ORDERING)
+
+
+def index_books(book_ids) -> set:
+    """
+    Brings the search document of the given books up to date, writing only
+    the terms that changed. Returns the set of added, removed or reweighted terms.
+    """
+    from .models import Book, BookSearchTerm
+
+    book_ids = list(set(book_ids))
+    changed_terms = set()
+
+    for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+        batch = book_ids[start:start + INDEX_BATCH_SIZE]
+
+        books = Book.objects.filter(pk__in=batch).select_related(
+            'collection').prefetch_related('authors', 'translators')
+        wanted = {book.pk: book_terms(book) for book in books}
+
+        current = {}
+        for pk, book_id, term, weight in BookSearchTerm.objects.filter(
+                book_id__in=batch).values_list('pk', 'book_id', 'term', 'weight'):
+            current.setdefault(book_id, {})[term] = (pk, weight)
+
+        stale = []
+        fresh = []
+        for book_id in batch:
+            old_terms = current.get(book_id, {})
+            new_terms = wanted.get(book_id, {})
+
+            for term, (pk, weight) in old_terms.items():
+                if new_terms.get(term) != weight:
+                    stale.append(pk)
+                    changed_terms.add(term)
+
+            for term, weight in new_terms.items():
+                if term not in old_terms or old_terms[term][1] != weight:
+                    fresh.append(BookSearchTerm(book_id=book_id, term=term, weight=weight))
+                    changed_terms.add(term)
+
+        with transaction.atomic():
+            BookSearchTerm.objects.filter(pk__in=stale).delete()
+            BookSearchTerm.objects.bulk_create(fresh, batch_size=INDEX_BATCH_SIZE)
+
+    if changed_terms:
+        search_index_changed.send(sender=BookSearchTerm, terms=changed_terms)
+
+    return changed_terms
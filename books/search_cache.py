@@ -0,0 +1,176 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from .facets import count_facets, filter_books
+from .pagination import KeysetPage, keyset_page
+from .search import SEARCH_ORDERING, query_terms, search_books
+
+CACHE_ALIAS = 'search'
+
+# Cached pages depend on a version per 3-letter bucket of their query terms.
+# A changed indexed term bumps the buckets of all its prefixes up to that length,
+# which covers every query term that could prefix-match it. Versions live in the
+# search cache itself: with a cache per worker, the others keep their pages until
+# the cache timeout, see SEARCH_CACHE_URL.
+BUCKET_LENGTH = 3
+
+# Facet counts and filtered pages also move with the books and copies (publisher, status,
+# borrows...), which do not touch the search index. They depend on one more version,
+# bumped by `invalidate_filters`, and are only kept for a short while for the bulk
+# writes that do not bump it
+FACETS_TIMEOUT = 60
+
+FILTERS_KEY = 'search:filters'
+
+_STATS_KEYS = {
+    'hits': 'search:stats:hits',
+    'misses': 'search:stats:misses',
+}
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _bucket_key(bucket):
+    return f'search:bucket:{bucket}'
+
+
+def _bucket_versions(terms) -> list:
+    cache = _cache()
+    keys = sorted({_bucket_key(term[:BUCKET_LENGTH]) for term in terms})
+    versions = cache.get_many(keys)
+
+    for key in keys:
+        if key not in versions:
+            # Start from the clock, so a bucket evicted and created again never
+            # goes back to a version an old cached page was stored under
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+
+    return [versions[key] for key in keys]
+
+
+def _filters_version():
+    cache = _cache()
+    version = cache.get(FILTERS_KEY)
+    if version is None:
+        cache.add(FILTERS_KEY, time.time_ns(), timeout=None)
+        version = cache.get(FILTERS_KEY)
+    return version
+
+
+def _page_key(terms, token, size, filters) -> str:
+    versions = _bucket_versions(terms) + ([_filters_version()] if filters else [])
+    data = json.dumps([terms, token, size, filters, versions], sort_keys=True)
+    return 'search:page:' + hashlib.sha1(data.encode()).hexdigest()
+
+
+def _facets_key(terms, filters) -> str:
+    data = json.dumps([terms, filters, _bucket_versions(terms), _filters_version()], sort_keys=True)
+    return 'search:facets:' + hashlib.sha1(data.encode()).hexdigest()
+
+
+def _count(stat):
+    cache = _cache()
+    try:
+        cache.incr(_STATS_KEYS[stat])
+    except ValueError:
+        cache.add(_STATS_KEYS[stat], 1, timeout=None)
+
+
+def invalidate_terms(terms):
+    cache = _cache()
+    buckets = {term[:length] for term in terms for length in range(1, BUCKET_LENGTH + 1)}
+
+    for bucket in buckets:
+        try:
+            cache.incr(_bucket_key(bucket))
+        except ValueError:
+            # No cached page was stored under this bucket
+            pass
+
+
+def invalidate_filters():
+    """Drops the facet counts and filtered pages, after a change to what the facets filter on."""
+    try:
+        _cache().incr(FILTERS_KEY)
+    except ValueError:
+        # Nothing was cached under it yet
+        pass
+
+
+def search_page(search_text, token=None, size=None, filters=None) -> KeysetPage:
+    """
+    One page of `Book.search_by_text`, narrowed by the facet `filters`, served from
+    the search cache when possible.
+
+    Only book ids are cached, books are always loaded fresh, so edits that do
+    not change the search index (publisher names, translators count...) never
+    show stale data.
+    """
+    from .models import Book
+
+    terms = query_terms(search_text)
+    cache = _cache()
+    key = _page_key(terms, token, size, filters or {})
+    cached = cache.get(key)
+
+    if cached is not None:
+        _count('hits')
+
+        books = Book.objects.with_listing_data().in_bulk(cached['ids'])
+        items = []
+        for pk, rank in zip(cached['ids'], cached['ranks']):
+            if pk in books:
+                books[pk].search_rank = rank
+                items.append(books[pk])
+
+        return KeysetPage(items, cached['next_token'])
+
+    _count('misses')
+
+    page = keyset_page(Book.search_by_text(search_text, filters), SEARCH_ORDERING, token=token, size=size,
+                       salt='books.search')
+    cache.set(key, {
+        'ids': [book.pk for book in page.items],
+        'ranks': [book.search_rank for book in page.items],
+        'next_token': page.next_token,
+    }, timeout=FACETS_TIMEOUT if filters else DEFAULT_TIMEOUT)
+
+    return page
+
+
+def search_facets(search_text, filters=None) -> dict:
+    """`facets.count_facets` of the books matching the search text and `filters`, cached."""
+    terms = query_terms(search_text)
+    cache = _cache()
+    key = _facets_key(terms, filters or {})
+    counts = cache.get(key)
+
+    if counts is None:
+        books = filter_books(search_books(search_text), filters or {}).order_by().values('pk')
+        counts = count_facets(books)
+        cache.set(key, counts, timeout=FACETS_TIMEOUT)
+
+    return counts
+
+
+def stats() -> dict:
+    values = _cache().get_many(_STATS_KEYS.values())
+    hits = values.get(_STATS_KEYS['hits'], 0)
+    misses = values.get(_STATS_KEYS['misses'], 0)
+
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def reset_stats():
+    _cache().delete_many(_STATS_KEYS.values())
@@ -1,8 +1,21 @@
 from rest_framework import serializers
-from .models import Author, Publisher
+from .models import Author, Book, PhysicalBook, Publisher, Shelf
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Keeps only the fields listed in the `fields` query parameter, e.g. `?fields=id,title`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request and request.query_params.get('fields'):
+            wanted = set(request.query_params['fields'].split(','))
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class AuthorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = '__all__'
@@ -12,3 +25,46 @@ class PublisherSerializer(serializers.ModelSerializer):
     class Meta:
         model = Publisher
         fields = '__all__'
+
+
+class NameSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class ShelfSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Shelf
+        fields = ('id', 'ddc', 'description', 'updated_at')
+
+
+class ShelfNameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Shelf
+        fields = ('id', 'ddc', 'description')
+
+
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    authors = NameSerializer(many=True)
+    translators = NameSerializer(many=True)
+    publisher = NameSerializer()
+    collection = NameSerializer()
+    available = serializers.BooleanField()
+
+    class Meta:
+        model = Book
+        fields = ('id', 'isbn', 'title', 'volume', 'edition', 'local', 'year', 'page_count', 'pha',
+                  'authors', 'translators', 'publisher', 'collection', 'available', 'updated_at')
+
+
+class PhysicalBookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    shelf = ShelfNameSerializer()
+    available = serializers.BooleanField(source='is_available')
+    due_date = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PhysicalBook
+        fields = ('id', 'physical_id', 'book', 'shelf', 'status', 'available', 'due_date', 'updated_at')
+
+    def get_due_date(self, physical_book):
+        return physical_book.current_borrow.due_date if physical_book.current_borrow_id else None
@@ -0,0 +1,248 @@
+from collections import Counter
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, subjects
+from .circulation import apply_circulation_changes, apply_status_changes, borrow_changes, copy_moved_changes
+from .models import Author, Book, Borrow, Collection, PhysicalBook, Publisher, Reader, Shelf, Translator
+from .search import index_books, search_index_changed
+from .search_cache import invalidate_filters, invalidate_terms
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_books([instance.pk])
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_terms(sender, instance, **kwargs):
+    instance._search_terms = set(instance.search_terms.values_list('term', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def forget_book_terms(sender, instance, **kwargs):
+    search_index_changed.send(sender=Book, terms=getattr(instance, '_search_terms', set()))
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.translators.through)
+def index_book_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            Book.objects.filter(pk=instance.pk).touch()
+            index_books([instance.pk])
+        return
+
+    # Reverse side: `instance` is the author/translator and `pk_set` holds books
+    if action == 'pre_clear':
+        instance._search_book_ids = list(sender.objects.filter(
+            **{sender._meta.get_field(instance._meta.model_name).attname: instance.pk}
+        ).values_list('book_id', flat=True))
+    elif action == 'post_clear':
+        book_ids = getattr(instance, '_search_book_ids', [])
+        Book.objects.filter(pk__in=book_ids).touch()
+        index_books(book_ids)
+    elif action in ('post_add', 'post_remove'):
+        Book.objects.filter(pk__in=pk_set or []).touch()
+        index_books(pk_set or [])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Translator)
+@receiver(post_save, sender=Collection)
+def index_related_books(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        instance.book_set.touch()
+        index_books(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Publisher)
+def touch_publisher_books(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        instance.book_set.touch()
+
+
+@receiver(post_save, sender=Shelf)
+def touch_shelf_books(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        instance.physicalbook_set.update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Translator)
+def remember_related_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Translator)
+def index_orphaned_books(sender, instance, **kwargs):
+    book_ids = getattr(instance, '_search_book_ids', [])
+    Book.objects.filter(pk__in=book_ids).touch()
+    index_books(book_ids)
+
+
+@receiver(search_index_changed)
+def invalidate_search_cache(sender, terms, **kwargs):
+    # Wait for the commit, or a concurrent search could cache the old results again
+    if terms:
+        transaction.on_commit(partial(invalidate_terms, set(terms)))
+
+
+def _copy_shelf_id(book_id):
+    return PhysicalBook.objects.filter(pk=book_id).values_list('shelf_id', flat=True).first()
+
+
+def _borrow_shelf_id(borrow):
+    if Borrow.book.is_cached(borrow):
+        return borrow.book.shelf_id
+    return _copy_shelf_id(borrow.book_id)
+
+
+@receiver(pre_save, sender=Borrow)
+def remember_borrow_circulation(sender, instance, raw=False, **kwargs):
+    # (date_borrow, date_return, copy) counted before this save, None if what is counted does not change
+    instance._counted = None
+    if raw or not any(instance.changed(field) for field in ('book_id', 'date_borrow', 'date_return')):
+        return
+
+    instance._counted = []
+    loaded = getattr(instance, '_loaded', {})
+    if not instance._state.adding and all(field in loaded for field in ('date_borrow', 'date_return', 'book_id')):
+        instance._counted.append((loaded['date_borrow'], loaded['date_return'], loaded['book_id']))
+    elif instance.pk:
+        instance._counted.extend(Borrow.objects.filter(pk=instance.pk).values_list('date_borrow', 'date_return', 'book'))
+
+
+@receiver(post_save, sender=Borrow)
+def count_borrow_circulation(sender, instance, raw=False, **kwargs):
+    counted = getattr(instance, '_counted', None)
+    if raw or counted is None:
+        return
+
+    shelf_id = _borrow_shelf_id(instance)
+    changes = borrow_changes(instance.date_borrow, instance.date_return, shelf_id)
+    for date_borrow, date_return, book_id in counted:
+        old_shelf_id = shelf_id if book_id == instance.book_id else _copy_shelf_id(book_id)
+        changes.update(borrow_changes(date_borrow, date_return, old_shelf_id, sign=-1))
+    apply_circulation_changes(changes)
+
+
+@receiver(post_delete, sender=Borrow)
+def uncount_borrow_circulation(sender, instance, **kwargs):
+    apply_circulation_changes(
+        borrow_changes(instance.date_borrow, instance.date_return, _borrow_shelf_id(instance), sign=-1))
+
+
+@receiver(pre_save, sender=PhysicalBook)
+def remember_physical_book_state(sender, instance, raw=False, **kwargs):
+    # (status, book, shelf) counted before this save, or None
+    instance._old_state = None
+    if instance.pk and not raw:
+        loaded = getattr(instance, '_loaded', {})
+        if not instance._state.adding and all(field in loaded for field in PhysicalBook.TRACKED_FIELDS):
+            instance._old_state = tuple(loaded[field] for field in PhysicalBook.TRACKED_FIELDS)
+        else:
+            instance._old_state = PhysicalBook.objects.filter(pk=instance.pk).values_list(
+                'status', 'book', 'shelf').first()
+
+
+def _shelf_subject_key(shelf_id):
+    if shelf_id is None:
+        return None
+    return Shelf.objects.filter(pk=shelf_id).values_list('subject_key', flat=True).first()
+
+
+def _subject_key(copy):
+    if copy.shelf_id is not None and PhysicalBook.shelf.is_cached(copy):
+        return copy.shelf.subject_key
+    return _shelf_subject_key(copy.shelf_id)
+
+
+@receiver(post_save, sender=PhysicalBook)
+def count_physical_book(sender, instance, raw=False, **kwargs):
+    old_state = getattr(instance, '_old_state', None)
+    if raw or old_state == (instance.status, instance.book_id, instance.shelf_id):
+        return
+
+    changes = Counter({instance.status: 1})
+    if old_state:
+        changes[old_state[0]] -= 1
+    apply_status_changes(changes)
+
+    key = _subject_key(instance)
+    added = [(instance.pk, instance.book_id, key)]
+    removed = []
+    if old_state:
+        old_key = key if old_state[2] == instance.shelf_id else _shelf_subject_key(old_state[2])
+        removed = [(instance.pk, old_state[1], old_key)]
+    if added != removed:
+        subjects.apply_changes(subjects.copy_changes(added, removed))
+
+    if old_state and old_state[2] != instance.shelf_id:
+        apply_circulation_changes(copy_moved_changes(instance.pk, old_state[2], instance.shelf_id))
+
+
+@receiver(post_delete, sender=PhysicalBook)
+def uncount_physical_book(sender, instance, **kwargs):
+    apply_status_changes(Counter({instance.status: -1}))
+    subjects.apply_changes(subjects.copy_changes(removed=[(instance.pk, instance.book_id, _subject_key(instance))]))
+
+
+@receiver(pre_save, sender=Shelf)
+def remember_shelf_subject(sender, instance, raw=False, **kwargs):
+    instance._old_subject_key = None
+    if instance.pk and not raw:
+        instance._old_subject_key = Shelf.objects.filter(pk=instance.pk).values_list('subject_key', flat=True).first()
+
+
+@receiver(post_save, sender=Shelf)
+def move_shelf_subject(sender, instance, created, raw=False, **kwargs):
+    old_key = getattr(instance, '_old_subject_key', None)
+    if not created and not raw and old_key != instance.subject_key:
+        copies = list(instance.physicalbook_set.values_list('pk', 'book'))
+        subjects.apply_changes(subjects.copy_changes(
+            added=[(pk, book_id, instance.subject_key) for pk, book_id in copies],
+            removed=[(pk, book_id, old_key) for pk, book_id in copies]))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=PhysicalBook)
+@receiver(post_save, sender=Publisher)
+@receiver(post_save, sender=Reader)
+@receiver(post_save, sender=Translator)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=PhysicalBook)
+@receiver(post_delete, sender=Publisher)
+@receiver(post_delete, sender=Reader)
+@receiver(post_delete, sender=Translator)
+def invalidate_autocomplete(sender, **kwargs):
+    transaction.on_commit(partial(autocomplete.invalidate, sender))
+
+
+@receiver(search_index_changed)
+def invalidate_book_autocomplete(sender, **kwargs):
+    # Books and copies are autocompleted through the search index
+    transaction.on_commit(partial(autocomplete.invalidate, Book))
+    transaction.on_commit(partial(autocomplete.invalidate, PhysicalBook))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=PhysicalBook)
+@receiver(post_save, sender=Borrow)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=PhysicalBook)
+@receiver(post_delete, sender=Borrow)
+def invalidate_search_filters(sender, raw=False, **kwargs):
+    # Publisher, year, status, availability... what the search facets filter on
+    if not raw:
+        transaction.on_commit(invalidate_filters)
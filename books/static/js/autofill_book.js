@@ -45,89 +45,62 @@ fill_book_field = (field_id, value) => {
   document.getElementById(field_id).value = value;
 };
 
-fill_book_authors = (authors) => {
-  var $crf_token = django.jQuery('[name="csrfmiddlewaretoken"]').attr('value');
-
-  // Fetch the preselected item, and add to the control
-  const authorsSelect = django.jQuery('#id_authors');
-  authorsSelect.val(null).trigger('change');
-
-  authors.forEach((author) => {
-    django.jQuery.ajax({
-
-      method: 'POST',
-      url: '/api/authors/get_or_create',
-      data: { name: `${author}` },
-      headers: { "X-CSRFToken": $crf_token },
-
-    }).done(function (data) {
-
-      // create the option and append to Select2
-      var option = new Option(data.name, data.id, true, true);
-      authorsSelect.append(option).trigger('change');
-
-      // manually trigger the `select2:select` event
-      authorsSelect.trigger({
-        type: 'select2:select',
-        params: {
-          data: data
-        }
-      });
-    });
+select_option = (select, data) => {
+  // create the option and append to Select2
+  var option = new Option(data.name, data.id, true, true);
+  select.append(option).trigger('change');
+
+  // manually trigger the `select2:select` event
+  select.trigger({
+    type: 'select2:select',
+    params: {
+      data: data
+    }
   });
 };
 
-fill_book_pubsher = (publisher) => {
+fill_book_relations = (authors, publisher) => {
   var $crf_token = django.jQuery('[name="csrfmiddlewaretoken"]').attr('value');
 
-  // Fetch the preselected item, and add to the control
+  // Fetch the preselected items, and add to the controls
+  const authorsSelect = django.jQuery('#id_authors');
   const publisherSelect = django.jQuery('#id_publisher');
+  authorsSelect.val(null).trigger('change');
   publisherSelect.val(null).trigger('change');
 
+  const data = { authors: authors || [] };
+  if (publisher) {
+    data.publishers = [publisher];
+  }
+
+  // Resolve every name in a single request
   django.jQuery.ajax({
 
     method: 'POST',
-    url: '/api/publishers/get_or_create',
-    data: { name: `${publisher}` },
+    url: '/api/get_or_create',
+    data: JSON.stringify(data),
+    contentType: 'application/json',
     headers: { "X-CSRFToken": $crf_token },
 
   }).done(function (data) {
-
-    // create the option and append to Select2
-    var option = new Option(data.name, data.id, true, true);
-    publisherSelect.append(option).trigger('change');
-
-    // manually trigger the `select2:select` event
-    publisherSelect.trigger({
-      type: 'select2:select',
-      params: {
-        data: data
-      }
-    });
+    (data.authors || []).forEach((author) => select_option(authorsSelect, author));
+    (data.publishers || []).forEach((publisher) => select_option(publisherSelect, publisher));
   });
 };
 
-fill_book = (json) => {
-
-  if (json.items) {
-    const book = json.items[0];
+fill_book = (book) => {
 
-    // Title
-    fill_book_field("id_title", book.volumeInfo.title);
+  // Title
+  fill_book_field("id_title", book.title);
 
-    // Authors
-    fill_book_authors(book.volumeInfo.authors);
+  // Authors and publisher
+  fill_book_relations(book.authors, book.publisher);
 
-    // Publisher
-    fill_book_pubsher(book.volumeInfo.publisher);
+  // Year
+  fill_book_field("id_year", book.year || "");
 
-    // Year
-    const year = new Date(book.volumeInfo.publishedDate).getFullYear();
-    fill_book_field("id_year", year);
-
-    // Page count
-    fill_book_field("id_page_count", book.volumeInfo.pageCount);
-  }
+  // Page count
+  fill_book_field("id_page_count", book.page_count || "");
 };
 
 try_fill_book = () => {
@@ -136,11 +109,7 @@ try_fill_book = () => {
   if (input && is_isbn(input.value)) {
     const isbn = normalize_isbn(input.value);
     var xhr = new XMLHttpRequest();
-    xhr.open(
-      "GET",
-      `https://www.googleapis.com/books/v1/volumes?q=isbn%3D${isbn}&maxResults=1`,
-      true
-    );
+    xhr.open("GET", `/api/isbn/${isbn}`, true);
 
     xhr.onreadystatechange = function () {
       if (xhr.readyState != 4 || xhr.status != 200) {
@@ -0,0 +1,137 @@
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils.translation import ugettext_lazy as _
+
+# Digits of a DDC code kept in its key, '823.914' is stored as '823914'
+KEY_LENGTH = 12
+
+DDC_CLASSES = {
+    '0': _('Computer science, information and general works'),
+    '1': _('Philosophy and psychology'),
+    '2': _('Religion'),
+    '3': _('Social sciences'),
+    '4': _('Language'),
+    '5': _('Science'),
+    '6': _('Technology'),
+    '7': _('Arts and recreation'),
+    '8': _('Literature'),
+    '9': _('History and geography'),
+}
+
+_DDC_RE = re.compile(r'\s*(\d{3})(?:\.(\d+))?')
+
+
+def ddc_key(ddc):
+    """
+    Key of a DDC code in the subject hierarchy: its digits, so every prefix of the key is one of
+    its broader subjects ('8' the 800s, '82' the 820s, '823', '8239'...). None if `ddc` is no DDC code.
+    """
+    match = _DDC_RE.match(ddc or '')
+    if not match:
+        return None
+    return (match.group(1) + (match.group(2) or ''))[:KEY_LENGTH]
+
+
+def ancestors(key) -> list:
+    """Keys of `key` and all its broader subjects, broadest first."""
+    return [key[:length] for length in range(1, len(key) + 1)] if key else []
+
+
+def key_range(key) -> dict:
+    """Lookups selecting `key` and its narrower subjects, a range read on the key index."""
+    return {'key__gte': key, 'key__lte': key + '9' * (KEY_LENGTH - len(key))}
+
+
+def label(key) -> str:
+    """DDC notation of a key, '8' is 800, '82' is 820 and '8239' is 823.9."""
+    if len(key) < 3:
+        return key.ljust(3, '0')
+    return key[:3] + ('.' + key[3:] if len(key) > 3 else '')
+
+
+def copy_changes(added=(), removed=()) -> Counter:
+    """
+    Changes to the subject counts when the copies `removed` leave their subject and the copies
+    `added` arrive in theirs, both given as (pk, book_id, key). Keyed by (node key, counter).
+
+    A title is counted once under a node however many of its copies are there, so other copies of
+    the same books are looked up, in one query.
+    """
+    from .models import PhysicalBook
+
+    changes = Counter()
+    pks = {copy[0] for copy in [*added, *removed]}
+    books = {copy[1] for copy in [*added, *removed]}
+
+    for sign, copies in ((1, added), (-1, removed)):
+        for copy in copies:
+            for node in ancestors(copy[2]):
+                changes[(node, 'copies')] += sign
+
+    others = {}
+    for book_id, key in PhysicalBook.objects.filter(book__in=books, shelf__subject_key__isnull=False).exclude(
+            pk__in=pks).order_by().values_list('book', 'shelf__subject_key').distinct():
+        others.setdefault(book_id, set()).update(ancestors(key))
+
+    for book_id in books:
+        before = {node for pk, book, key in removed if book == book_id for node in ancestors(key)}
+        after = {node for pk, book, key in added if book == book_id for node in ancestors(key)}
+        other = others.get(book_id, set())
+        for node in (after - other) - before:
+            changes[(node, 'titles')] += 1
+        for node in (before - other) - after:
+            changes[(node, 'titles')] -= 1
+
+    return changes
+
+
+def apply_changes(changes):
+    """Adds `changes`, as built by `copy_changes`, to the subject nodes, creating the missing ones."""
+    from .models import SubjectNode
+
+    nodes = {}
+    for (key, field), delta in changes.items():
+        if delta:
+            nodes.setdefault(key, {})[field] = F(field) + delta
+
+    # Always in the same order, so concurrent writers do not deadlock
+    for key in sorted(nodes):
+        with transaction.atomic():
+            if not SubjectNode.objects.filter(key=key).update(**nodes[key]):
+                SubjectNode.objects.get_or_create(key=key, defaults={'depth': len(key)})
+                SubjectNode.objects.filter(key=key).update(**nodes[key])
+
+
+def rebuild():
+    """Recomputes the subject keys of the shelves, then every subject node from the copies."""
+    from .models import PhysicalBook, Shelf, SubjectNode
+
+    shelves = list(Shelf.objects.only('pk', 'ddc', 'subject_key'))
+    for shelf in shelves:
+        shelf.subject_key = ddc_key(shelf.ddc)
+
+    with transaction.atomic():
+        Shelf.objects.bulk_update(shelves, ['subject_key'], batch_size=1000)
+
+        copies = Counter()
+        for key, count in PhysicalBook.objects.filter(shelf__subject_key__isnull=False).order_by().values_list(
+                'shelf__subject_key').annotate(Count('pk')):
+            for node in ancestors(key):
+                copies[node] += count
+
+        titles = Counter()
+        book_nodes = {}
+        for book_id, key in PhysicalBook.objects.filter(shelf__subject_key__isnull=False).order_by().values_list(
+                'book', 'shelf__subject_key').distinct().iterator():
+            book_nodes.setdefault(book_id, set()).update(ancestors(key))
+        for nodes in book_nodes.values():
+            titles.update(nodes)
+
+        SubjectNode.objects.all().delete()
+        SubjectNode.objects.bulk_create((
+            SubjectNode(key=key, depth=len(key), copies=copies[key], titles=titles[key])
+            for key in sorted(copies)
+        ), batch_size=1000)
@@ -0,0 +1,211 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from . import circulation
+from .models import Author, Book, Borrow, DailyCirculation, PhysicalBook, Publisher, Reader, Shelf
+from .search import search_books
+
+
+def create_books(count, title='Dom Casmurro', borrow=False):
+    publisher = Publisher.objects.create(name=f'Publisher {Publisher.objects.count()}')
+
+    books = []
+    for i in range(count):
+        book = Book.objects.create(title=f'{title} {i}', publisher=publisher)
+        book.authors.add(Author.objects.create(name=f'Author {Author.objects.count()}'))
+        copy = PhysicalBook(book=book)
+        copy.save()
+        if borrow:
+            Borrow(book=copy, reader=Reader.objects.get_or_create(name='Reader')[0]).save()
+        books.append(book)
+    return books
+
+
+# The manifest of the deployed static files is only built by collectstatic
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class IndexQueriesTest(TestCase):
+    """The search results page reads a fixed number of queries, however many books it lists."""
+
+    def assertSearchQueries(self, count, books):
+        # A cold search cache, so the page and its facets are read from the database
+        for alias in ('default', 'search'):
+            caches[alias].clear()
+
+        with self.assertNumQueries(count):
+            response = self.client.get('/', {'search': 'casmurro', 'size': 50})
+        self.assertEqual(len(response.context['books']), books)
+
+    def test_constant_queries(self):
+        create_books(2)
+        self.assertSearchQueries(9, 2)
+
+        create_books(30)
+        self.assertSearchQueries(9, 32)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ChangelistQueriesTest(TestCase):
+    """Admin changelists read a fixed number of queries, however many rows they show."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def assertChangelistQueries(self, url, count, rows):
+        with self.assertNumQueries(count):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['cl'].result_list), rows)
+
+    def test_constant_queries(self):
+        urls = ('/admin/books/book/', '/admin/books/physicalbook/', '/admin/books/borrow/')
+
+        create_books(2, borrow=True)
+        for url in urls:
+            self.assertChangelistQueries(url, 6, 2)
+
+        create_books(30, borrow=True)
+        for url in urls:
+            self.assertChangelistQueries(url, 6, 32)
+
+
+class BorrowSaveTest(TestCase):
+    def test_checkout_updates_only_its_copy(self):
+        copy = PhysicalBook.objects.get(book=create_books(1)[0])
+        borrow = Borrow(book=copy, reader=Reader.objects.create(name='Reader'))
+
+        with CaptureQueriesContext(connection) as queries:
+            borrow.save()
+
+        copy_updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "books_physicalbook"')]
+        self.assertEqual(len(copy_updates), 1)
+        copy.refresh_from_db()
+        self.assertEqual(copy.current_borrow_id, borrow.pk)
+
+    def test_return_releases_the_copy(self):
+        copy = PhysicalBook.objects.get(book=create_books(1, borrow=True)[0])
+        borrow = copy.current_borrow
+        borrow.date_return = borrow.date_borrow
+        borrow.save()
+
+        copy.refresh_from_db()
+        self.assertIsNone(copy.current_borrow_id)
+
+    def test_return_keeps_the_due_date(self):
+        copy = PhysicalBook.objects.get(book=create_books(1, borrow=True)[0])
+        due_date = copy.current_borrow.due_date
+
+        with self.settings(LOAN_PERIOD_DAYS=30):
+            borrow = Borrow.objects.get(pk=copy.current_borrow_id)
+            borrow.date_return = borrow.date_borrow
+            borrow.save()
+            self.assertEqual(Borrow.objects.get(pk=borrow.pk).due_date, due_date)
+
+            borrow = Borrow.objects.get(pk=borrow.pk)
+            borrow.renew_count += 1
+            borrow.save()
+            self.assertEqual(Borrow.objects.get(pk=borrow.pk).due_date, borrow.compute_due_date())
+
+    def test_renew_reads_nothing(self):
+        copy = PhysicalBook.objects.get(book=create_books(1, borrow=True)[0])
+        borrow = Borrow.objects.get(pk=copy.current_borrow_id)
+
+        with CaptureQueriesContext(connection) as queries:
+            borrow.renew()
+
+        self.assertEqual([query['sql'] for query in queries if query['sql'].startswith('SELECT')], [])
+
+    def test_api_checkout_conflict_is_a_bad_request(self):
+        copy = PhysicalBook.objects.get(book=create_books(1, borrow=True)[0])
+
+        class CheckoutView(APIView):
+            permission_classes = []
+
+            def post(self, request):
+                Borrow(book_id=copy.pk, reader=Reader.objects.get(name='Reader')).save()
+                return Response(status=201)
+
+        response = CheckoutView.as_view()(APIRequestFactory().post('/'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data), ['book'])
+
+
+class CirculationRollupTest(TestCase):
+    def rollup(self):
+        return sorted(DailyCirculation.objects.exclude(borrows=0, returns=0).values_list(
+            'date', 'shelf', 'borrows', 'returns'))
+
+    def test_moved_copy_matches_rebuild(self):
+        first, second = Shelf.objects.create(description='First'), Shelf.objects.create(description='Second')
+        copy = PhysicalBook.objects.get(book=create_books(1)[0])
+        copy.shelf = first
+        copy.save()
+
+        reader = Reader.objects.create(name='Reader')
+        Borrow(book=copy, reader=reader, date_borrow=date(2024, 1, 1), date_return=date(2024, 1, 5)).save()
+        Borrow(book=copy, reader=reader, date_borrow=date(2024, 2, 1)).save()
+
+        copy.refresh_from_db()
+        copy.shelf = second
+        copy.save()
+
+        incremental = self.rollup()
+        circulation.rebuild()
+        self.assertEqual(incremental, self.rollup())
+        self.assertEqual({row[1] for row in incremental}, {second.pk})
+
+    def test_returned_borrow_matches_rebuild(self):
+        copy = PhysicalBook.objects.get(book=create_books(1)[0])
+        copy.shelf = Shelf.objects.create(description='First')
+        copy.save()
+        Borrow(book=copy, reader=Reader.objects.create(name='Reader'), date_borrow=date(2024, 1, 1)).save()
+
+        borrow = Borrow.objects.get(book=copy)
+        borrow.date_return = date(2024, 1, 5)
+        borrow.save()
+        borrow.observation = 'Returned at the desk'
+        borrow.save()
+
+        incremental = self.rollup()
+        circulation.rebuild()
+        self.assertEqual(incremental, self.rollup())
+
+
+class AutocompleteOrderTest(TestCase):
+    """Autocompletes answer in the order the search ranks, not in the order of the changelist."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        for alias in ('default', 'search'):
+            caches[alias].clear()
+
+    def autocomplete(self, model_name, field_name, term):
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'books', 'model_name': model_name, 'field_name': field_name, 'term': term})
+        return [int(result['id']) for result in response.json()['results']]
+
+    def test_books_by_rank(self):
+        create_books(3, title='Memorias')
+        # Newer books ranking higher, by their author too
+        author = Author.objects.create(name='Joao Memorias')
+        for book in create_books(3, title='Memorias'):
+            book.authors.add(author)
+
+        self.assertEqual(self.autocomplete('physicalbook', 'book', 'memorias')[:3],
+                         [book.pk for book in Book.objects.filter(authors=author).order_by('pk')])
+        self.assertEqual(self.autocomplete('physicalbook', 'book', 'memorias'),
+                         list(search_books('memorias').values_list('pk', flat=True)))
+
+    def test_exact_physical_id_first(self):
+        create_books(3, title='Contos 42')
+        copy = PhysicalBook.objects.get(book=create_books(1, title='Outro')[0])
+        copy.physical_id = 42
+        copy.save()
+
+        self.assertEqual(self.autocomplete('borrow', 'book', '42')[0], copy.pk)
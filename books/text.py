@@ -0,0 +1,19 @@
+import re
+import unicodedata
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def fold(text) -> str:
+    """Casefold and strip accents, so 'Ação' and 'acao' compare equal."""
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text) -> list:
+    return _TOKEN_RE.findall(fold(text)) if text else []
+
+
+def normalize_name(name) -> str:
+    """Key comparing names ignoring case, accents and extra whitespace."""
+    return ' '.join(fold(name).split())
@@ -1,9 +1,25 @@
-from django.urls import path
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
 
 from . import views
 
+router = DefaultRouter()
+router.register('books', views.BookViewSet)
+router.register('physical_books', views.PhysicalBookViewSet)
+router.register('authors', views.AuthorViewSet)
+router.register('shelves', views.ShelfViewSet)
+
 urlpatterns = [
     path('', views.index, name='index'),
+    path('subjects/', views.browse_subjects, name='subjects'),
+    path('subjects/<str:key>', views.browse_subjects, name='subject'),
     path('api/authors/get_or_create', views.AuthorGetOrCreateApiView.as_view()),
     path('api/publishers/get_or_create', views.PublisherGetOrCreateApiView.as_view()),
+    path('api/get_or_create', views.BulkGetOrCreateApiView.as_view()),
+    path('api/isbn/<str:isbn>', views.IsbnMetadataApiView.as_view()),
+    path('api/search/cache_stats', views.SearchCacheStatsApiView.as_view()),
+    path('api/request_stats', views.RequestStatsApiView.as_view()),
+    path('api/desk', views.DeskApiView.as_view()),
+    path('api/export/<str:name>', views.ExportApiView.as_view(), name='export'),
+    path('api/', include(router.urls)),
 ]
@@ -1,11 +1,61 @@
-from django.core.exceptions import BadRequest
+import hashlib
+from calendar import timegm
+from datetime import date, datetime, timezone
+
+from django.core.exceptions import BadRequest, ValidationError as DjangoValidationError
+from django.db import transaction
+from django.conf import settings
+from django.contrib import admin
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework import status
+from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import DjangoModelPermissionsOrAnonReadOnly, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.views import APIView
+from rest_framework.views import APIView, exception_handler
+
+from .models import Author, Book, Collection, PhysicalBook, Publisher, Reader, Shelf, SubjectNode, Translator
+from .pagination import CatalogCursorPagination, page_size
+from . import desk, exports, facets, profiling, request_stats, search_cache, subjects
+from .isbn_metadata import MetadataProviderError, get_service
+from .serializers import (AuthorSerializer, BookSerializer, PhysicalBookSerializer, PublisherSerializer,
+                          ShelfSerializer)
+from .text import normalize_name
+
+
+def api_exception_handler(exc, context):
+    """
+    DRF's handler, also answering 400 for the ValidationError models raise on save, such as a book
+    already borrowed, see `Borrow.save`.
+    """
+    if isinstance(exc, DjangoValidationError):
+        exc = ValidationError(exc.message_dict if hasattr(exc, 'error_dict') else exc.messages)
+    return exception_handler(exc, context)
+
+
+def profiles(request):
+    """Admin page listing the saved request profiles, see `profiling.ProfilerMiddleware`."""
+    return TemplateResponse(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': _('Request profiles'),
+        'enabled': settings.PROFILER,
+        'profiles': [{'name': path.name, 'size': path.stat().st_size,
+                      'modified': datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)}
+                     for path in profiling.list_profiles()],
+    })
 
-from .models import Author, Book, Publisher
-from .serializers import AuthorSerializer, PublisherSerializer
+
+def profile_download(request, name):
+    path = profiling.find_profile(name)
+    if path is None:
+        raise Http404
+
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name, content_type='text/plain')
 
 
 def index(request):
@@ -15,13 +65,57 @@ def index(request):
         if len(search_text) < 3:
             raise BadRequest("Search query must have at least 3 characters")
 
-        result = Book.search_by_text(search_text)
+        filters = facets.parse_filters(request.GET)
+        page = search_cache.search_page(search_text, token=request.GET.get('after'), size=page_size(request),
+                                        filters=filters)
+
+        query = request.GET.copy()
+        query.pop('after', None)
 
-        return render(request, 'index.html', {'books': result, 'search_text': search_text})
+        return render(request, 'index.html', {
+            'books': page.items,
+            'next_token': page.next_token,
+            'is_first_page': not request.GET.get('after'),
+            'search_text': search_text,
+            'query': query.urlencode(),
+            'facets': facets.facet_links(search_cache.search_facets(search_text, filters), request.GET),
+            'filters': filters,
+        })
 
     return render(request, 'index.html', {'books': []})
 
 
+def browse_subjects(request, key=''):
+    """A subject of the DDC hierarchy and its narrower subjects, with their counts, in one range read."""
+    if key and not key.isdigit():
+        raise Http404
+
+    nodes = list(SubjectNode.objects.subtree(key).filter(
+        depth__in=(len(key), len(key) + 1), copies__gt=0).order_by('key'))
+    node = nodes.pop(0) if nodes and nodes[0].key == key else None
+    if key and node is None:
+        raise Http404
+
+    descriptions = {}
+    for subject_key, description in Shelf.objects.filter(
+            subject_key__in=[key, *(child.key for child in nodes)]).order_by('description').values_list(
+            'subject_key', 'description'):
+        descriptions.setdefault(subject_key, []).append(description)
+
+    def describe(subject_key):
+        return {
+            'key': subject_key,
+            'label': subjects.label(subject_key),
+            'descriptions': descriptions.get(subject_key) or [subjects.DDC_CLASSES.get(subject_key, '')],
+        }
+
+    return render(request, 'subjects.html', {
+        'node': node and {**describe(key), 'titles': node.titles, 'copies': node.copies},
+        'ancestors': [describe(ancestor) for ancestor in subjects.ancestors(key)[:-1]],
+        'children': [{**describe(child.key), 'titles': child.titles, 'copies': child.copies} for child in nodes],
+    })
+
+
 class AuthorGetOrCreateApiView(APIView):
     queryset = Author.objects.all()
 
@@ -30,7 +124,8 @@ def post(self, request, *args, **kwargs):
         if not name:
             return Response('Author name not suplied', status=status.HTTP_400_BAD_REQUEST)
 
-        author, created = Author.objects.get_or_create(name=name)
+        author, created = Author.objects.get_or_create(
+            name_key=normalize_name(name), defaults={'name': name.strip()})
 
         serializer = AuthorSerializer(author)
 
@@ -45,8 +140,312 @@ def post(self, request, *args, **kwargs):
         if not name:
             return Response('Publisher name not suplied', status=status.HTTP_400_BAD_REQUEST)
 
-        publisher, created = Publisher.objects.get_or_create(name=name)
+        publisher, created = Publisher.objects.get_or_create(
+            name_key=normalize_name(name), defaults={'name': name.strip()})
 
         serializer = PublisherSerializer(publisher)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class BulkGetOrCreateApiView(APIView):
+    """Resolves lists of names per entity type to id/name pairs, creating the missing entries."""
+    permission_classes = [IsAuthenticated]
+    models = {
+        'authors': Author,
+        'publishers': Publisher,
+        'translators': Translator,
+        'collections': Collection,
+    }
+    max_names = 100
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, dict) or not set(request.data) & set(self.models):
+            return Response(f"Expected lists of names for any of: {', '.join(self.models)}",
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        requested = {}
+        for entity, model in self.models.items():
+            if entity not in request.data:
+                continue
+
+            names = request.data.getlist(entity) if hasattr(request.data, 'getlist') else request.data[entity]
+            if not isinstance(names, list) or len(names) > self.max_names or \
+                    not all(isinstance(name, str) and name.strip() for name in names):
+                return Response(f'{entity} must be a list of up to {self.max_names} names',
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            if not request.user.has_perms([f'books.view_{model._meta.model_name}',
+                                           f'books.add_{model._meta.model_name}']):
+                return Response(status=status.HTTP_403_FORBIDDEN)
+
+            requested[entity] = names
+
+        with transaction.atomic():
+            result = {
+                entity: [{'id': obj.pk, 'name': obj.name} for obj in self.models[entity].objects.bulk_get_or_create(names)]
+                for entity, names in requested.items()
+            }
+
+        return Response(result)
+
+
+class IsbnMetadataApiView(APIView):
+    queryset = Book.objects.all()
+
+    def get(self, request, isbn, *args, **kwargs):
+        try:
+            metadata = get_service().lookup(isbn)
+        except MetadataProviderError:
+            return Response('ISBN metadata provider unavailable', status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if metadata is None:
+            return Response('ISBN not found', status=status.HTTP_404_NOT_FOUND)
+
+        return Response(metadata)
+
+
+class SearchCacheStatsApiView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(search_cache.stats())
+
+    def delete(self, request, *args, **kwargs):
+        search_cache.reset_stats()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RequestStatsApiView(APIView):
+    """Request timings of the worker process that answers, see `request_stats`."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(request_stats.stats.snapshot())
+
+    def delete(self, request, *args, **kwargs):
+        request_stats.stats.reset()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DeskApiView(APIView):
+    """
+    Checks out, returns or renews a batch of copies: `action`, `physical_ids` and `reader` (the id
+    of the reader, needed for checkouts). Answers the borrows done and the copies refused, with why.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        action = request.data.get('action')
+        if action not in desk.ACTIONS:
+            return Response(f"action must be one of: {', '.join(desk.ACTIONS)}", status=status.HTTP_400_BAD_REQUEST)
+
+        physical_ids = request.data.get('physical_ids')
+        if not isinstance(physical_ids, list) or len(physical_ids) > desk.MAX_COPIES or \
+                not all(isinstance(physical_id, int) for physical_id in physical_ids):
+            return Response(f'physical_ids must be a list of up to {desk.MAX_COPIES} physical IDs',
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not request.user.has_perm('books.add_borrow' if action == desk.CHECKOUT else 'books.change_borrow'):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        reader = None
+        if request.data.get('reader') is not None:
+            reader = Reader.objects.filter(pk=request.data['reader']).first() \
+                if isinstance(request.data['reader'], int) else None
+            if reader is None:
+                return Response('Unknown reader', status=status.HTTP_400_BAD_REQUEST)
+        elif action == desk.CHECKOUT:
+            return Response('Checkouts need a reader', status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = desk.process(action, physical_ids, reader)
+        except DjangoValidationError as e:
+            return Response(' '.join(e.messages), status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'done': [{
+                'physical_id': borrow.book.physical_id,
+                'borrow': borrow.pk,
+                'reader': borrow.reader_id,
+                'due_date': borrow.due_date,
+                'date_return': borrow.date_return,
+            } for borrow in result.done],
+            'errors': [{'physical_id': physical_id, 'error': error} for physical_id, error in result.errors],
+        })
+
+
+class ExportApiView(APIView):
+    """
+    Streams the export `name` as CSV, or JSON with `?output=json`, gzipped with `?gzip=1` and
+    filtered with `?since=` and `?until=` dates (YYYY-MM-DD). Rows are read and sent chunk by chunk.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name, *args, **kwargs):
+        if name not in exports.EXPORTS:
+            raise Http404()
+
+        output_format = request.query_params.get('output', 'csv')
+        if output_format not in exports.FORMATS:
+            raise ValidationError({'output': _('Unknown export format')})
+
+        dates = {}
+        for param in ('since', 'until'):
+            if request.query_params.get(param):
+                try:
+                    dates[param] = date.fromisoformat(request.query_params[param])
+                except ValueError:
+                    raise ValidationError({param: _('Invalid date, use YYYY-MM-DD')})
+
+        compress = request.query_params.get('gzip') == '1'
+        filename = f'{name}-{datetime.now():%Y%m%d-%H%M%S}.{output_format}' + ('.gz' if compress else '')
+        content_type = 'application/gzip' if compress else {
+            'csv': 'text/csv; charset=utf-8', 'json': 'application/json'}[output_format]
+
+        response = StreamingHttpResponse(
+            exports.stream(name, output_format, compress, **dates), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified from the rows a response serializes: their primary keys and `updated_at`,
+    and the counts and `updated_at` of their `stamp_relations`.
+
+    Requests with a validator read those rows alone first, the page from the plain `queryset`
+    without joins or prefetches, and are answered 304 before anything is serialized. Other requests
+    are stamped from the rows they serialized, plus one query when there are `stamp_relations`.
+    """
+    # Relations whose rows are serialized along, stamped by their `updated_at` and counts as well
+    stamp_relations = ()
+
+    def stamp(self, request, rows):
+        rows = list(rows)
+        pks = [row.pk for row in rows]
+        modified = [row.updated_at for row in rows]
+
+        related = {}
+        if self.stamp_relations and pks:
+            aggregates = {}
+            for relation in self.stamp_relations:
+                aggregates[f'{relation}_count'] = Count(relation, distinct=True)
+                aggregates[f'{relation}_last_modified'] = Max(f'{relation}__updated_at')
+            related = self.queryset.model.objects.filter(pk__in=pks).order_by().aggregate(**aggregates)
+            modified += [value for name, value in related.items() if name.endswith('last_modified')]
+
+        # A page moved by rows added or deleted after it is another page, even with the same rows
+        paginator = getattr(self, '_paginator', None)
+        links = (paginator.has_next, paginator.has_previous) if getattr(paginator, 'page', None) is not None else ()
+
+        last_modified = max(filter(None, modified), default=None)
+        key = f'{request.get_full_path()}|{request.accepted_media_type}|{pks}|{links}|{last_modified}|' \
+              f'{sorted(related.items())}'
+        self.etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        self.last_modified = timegm(last_modified.utctimetuple()) if last_modified else None
+
+    @staticmethod
+    def has_validator(request) -> bool:
+        return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+    def list(self, request, *args, **kwargs):
+        if self.has_validator(request):
+            # The page alone, from the plain `queryset`, without the joins and prefetches of `get_queryset`
+            queryset = self.filter_queryset(self.queryset.all())
+            page = self.paginate_queryset(queryset)
+            self.stamp(request, queryset if page is None else page)
+
+            not_modified = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+            if not_modified:
+                return not_modified
+
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.has_validator(request):
+            lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+            self.stamp(request, self.filter_queryset(self.queryset.filter(**lookup)))
+
+            not_modified = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+            if not_modified:
+                return not_modified
+
+        return super().retrieve(request, *args, **kwargs)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        self.served = page
+        return page
+
+    def get_object(self):
+        obj = super().get_object()
+        self.served = [obj]
+        return obj
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        if response.status_code == status.HTTP_200_OK and getattr(self, 'served', None) is not None:
+            # Stamped again from what was served, which may have changed since the validator was checked
+            self.stamp(request, self.served)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED) and getattr(self, 'etag', None):
+            response['ETag'] = self.etag
+            if self.last_modified:
+                response['Last-Modified'] = http_date(self.last_modified)
+
+        return response
+
+
+class CatalogViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    permission_classes = [DjangoModelPermissionsOrAnonReadOnly]
+    pagination_class = CatalogCursorPagination
+
+
+class BookViewSet(CatalogViewSet):
+    queryset = Book.objects.all()
+    serializer_class = BookSerializer
+    # `available` moves with the copies and their borrows, which do not touch the book
+    stamp_relations = ('physicalbook',)
+
+    def get_queryset(self):
+        return super().get_queryset().with_listing_data()
+
+
+class PhysicalBookViewSet(CatalogViewSet):
+    """Copies with their availability. Filter with `?book=<id>` and `?available=true|false`."""
+    queryset = PhysicalBook.objects.all()
+    serializer_class = PhysicalBookSerializer
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('shelf', 'current_borrow')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        if self.request.query_params.get('book'):
+            try:
+                queryset = queryset.filter(book_id=int(self.request.query_params['book']))
+            except ValueError:
+                raise ValidationError({'book': 'Must be a number'})
+
+        available = self.request.query_params.get('available')
+        if available == 'true':
+            queryset = queryset.available()
+        elif available == 'false':
+            queryset = queryset.unavailable()
+
+        return queryset
+
+
+class AuthorViewSet(CatalogViewSet):
+    queryset = Author.objects.all()
+    serializer_class = AuthorSerializer
+
+
+class ShelfViewSet(CatalogViewSet):
+    queryset = Shelf.objects.all()
+    serializer_class = ShelfSerializer
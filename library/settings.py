@@ -67,6 +67,12 @@
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Outermost, so it also sees the queries of the other middleware
+MIDDLEWARE.insert(0, 'books.request_stats.RequestStatsMiddleware')
+# Right after authentication, which tells whether the user may ask for a profile
+MIDDLEWARE.insert(MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1,
+                  'books.profiling.ProfilerMiddleware')
+
 ROOT_URLCONF = 'library.urls'
 
 TEMPLATES = [
@@ -111,9 +117,51 @@
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissions'
-    ]
+    ],
+    'PAGE_SIZE': 50,
+    'EXCEPTION_HANDLER': 'books.views.api_exception_handler',
+}
+
+# Caches
+# The search cache holds result pages of the public search, evicting the least
+# recently used ones past max_entries. Writes invalidate it by bumping versions stored in it, so they
+# only reach every worker through a shared backend, e.g. filecache:///var/tmp/search. The default, one
+# locmem cache per worker, bounds how long other workers serve stale results by its timeout in seconds.
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+    'search': env.cache_url('SEARCH_CACHE_URL', default='locmemcache://search?max_entries=2000&timeout=60'),
 }
 
+# Public search
+SEARCH_PAGE_SIZE = env.int('SEARCH_PAGE_SIZE', default=20)
+SEARCH_MAX_PAGE_SIZE = env.int('SEARCH_MAX_PAGE_SIZE', default=50)
+
+# ISBN metadata
+# Provider of book data by ISBN, books.isbn_metadata.FileProvider reads it from ISBN_METADATA_FILE instead
+ISBN_METADATA_PROVIDER = env('ISBN_METADATA_PROVIDER', default='books.isbn_metadata.GoogleBooksProvider')
+ISBN_METADATA_FILE = env('ISBN_METADATA_FILE', default=None)
+ISBN_METADATA_CACHE_DIR = env('ISBN_METADATA_CACHE_DIR', default=str(Path(BASE_DIR, 'var', 'isbn_metadata')))
+ISBN_METADATA_NEGATIVE_TTL = env.int('ISBN_METADATA_NEGATIVE_TTL', default=7 * 24 * 60 * 60)
+ISBN_METADATA_TIMEOUT = env.int('ISBN_METADATA_TIMEOUT', default=10)
+ISBN_METADATA_WORKERS = env.int('ISBN_METADATA_WORKERS', default=8)
+
+# Days a book may be kept, again for each renewal
+LOAN_PERIOD_DAYS = env.int('LOAN_PERIOD_DAYS', default=7)
+
+# Request instrumentation, served per worker at /api/request_stats
+# Server-Timing headers go to staff users on the pages that load the user, and to everyone with REQUEST_STATS_SERVER_TIMING
+REQUEST_STATS = env.bool('REQUEST_STATS', default=True)
+REQUEST_STATS_SLOW_MS = env.int('REQUEST_STATS_SLOW_MS', default=1000)
+REQUEST_STATS_SERVER_TIMING = env.bool('REQUEST_STATS_SERVER_TIMING', default=False)
+
+# Sampling profiler, for staff requests with an `X-Profile: 1` header or a `_profile=1` parameter
+# Profiles are kept in PROFILER_DIR, the newest PROFILER_KEEP of them, and listed at /admin/profiles/
+PROFILER = env.bool('PROFILER', default=True)
+PROFILER_DIR = env('PROFILER_DIR', default=str(Path(BASE_DIR, 'var', 'profiles')))
+PROFILER_KEEP = env.int('PROFILER_KEEP', default=100)
+PROFILER_INTERVAL_MS = env.int('PROFILER_INTERVAL_MS', default=5)
+PROFILER_MAX_PER_MINUTE = env.int('PROFILER_MAX_PER_MINUTE', default=6)
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -16,7 +16,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from books import views
+
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(views.profiles), name='profiles'),
+    path('admin/profiles/<str:name>', admin.site.admin_view(views.profile_download), name='profile_download'),
     path('admin/', admin.site.urls),
     path('', include('books.urls')),
 ]